@@ -63,6 +63,16 @@ class ResultAdmin(admin.ModelAdmin):
     list_filter = ('term', 'subject', 'grade')
     search_fields = ('student__student_id', 'student__user__first_name')
 
+@admin.register(ClassRanking)
+class ClassRankingAdmin(admin.ModelAdmin):
+    list_display = ('student', 'term', 'school_class', 'average', 'position', 'class_size')
+    list_filter = ('term', 'school_class')
+
+@admin.register(StudentTermSummary)
+class StudentTermSummaryAdmin(admin.ModelAdmin):
+    list_display = ('student', 'term', 'average', 'failures', 'subjects_taken', 'attendance_percentage')
+    list_filter = ('term', 'student__school_class')
+
 @admin.register(Quiz)
 class QuizAdmin(admin.ModelAdmin):
     list_display = ('title', 'subject', 'school_class', 'teacher', 'status', 'start_time')
@@ -78,6 +88,11 @@ class QuizAttemptAdmin(admin.ModelAdmin):
     list_display = ('quiz', 'student', 'final_score', 'is_submitted', 'is_graded', 'tab_switches')
     list_filter = ('is_submitted', 'is_graded', 'quiz__subject')
 
+@admin.register(IntegrityEvent)
+class IntegrityEventAdmin(admin.ModelAdmin):
+    list_display = ('attempt', 'event', 'timestamp')
+    list_filter = ('event', 'attempt__quiz')
+
 @admin.register(QuizAnswer)
 class QuizAnswerAdmin(admin.ModelAdmin):
     list_display = ('attempt', 'question', 'selected_answer', 'is_correct', 'manual_score')
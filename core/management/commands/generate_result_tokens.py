@@ -0,0 +1,37 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core.models import *
+
+class Command(BaseCommand):
+    help = 'Generate result checking tokens for every student without one for a term'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--term', type=int, help='Term ID (defaults to the active term)')
+        parser.add_argument('--class', dest='school_class', type=int, help='Only generate for this class ID')
+        parser.add_argument('--max-uses', type=int, default=3, help='Number of times each token can be used')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Tokens inserted per batch')
+
+    def handle(self, *args, **options):
+        if options['term']:
+            term = Term.objects.filter(id=options['term']).first()
+        else:
+            term = Term.objects.filter(is_active=True).first()
+        if not term:
+            raise CommandError('Term not found. Pass --term or set an active term.')
+
+        students = None
+        if options['school_class']:
+            students = Student.objects.filter(school_class_id=options['school_class'])
+
+        self.stdout.write(f'Generating tokens for {term}...')
+        started = time.monotonic()
+        created = ResultToken.objects.generate_for_term(
+            term,
+            max_uses=options['max_uses'],
+            students=students,
+            batch_size=options['batch_size']
+        )
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(f'Done in {elapsed:.2f}s: {created} tokens created'))
@@ -0,0 +1,57 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core.models import *
+
+class Command(BaseCommand):
+    help = 'Import questions into the question bank from a CSV, JSON lines or Aiken file'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='File to import')
+        parser.add_argument('--format', choices=['csv', 'jsonl', 'aiken'], help='File format (defaults to the file extension)')
+        parser.add_argument('--subject', help='Subject code or ID for rows without a subject column')
+        parser.add_argument('--teacher', help='Employee ID recorded as the creator')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Rows per bulk insert (default 1000)')
+
+    def handle(self, *args, **options):
+        path = options['path']
+        if not os.path.exists(path):
+            raise CommandError(f'File {path} not found.')
+
+        format = options['format'] or {
+            '.csv': 'csv', '.jsonl': 'jsonl', '.json': 'jsonl', '.txt': 'aiken'
+        }.get(os.path.splitext(path)[1].lower())
+        if not format:
+            raise CommandError('Cannot tell the format from the file extension. Pass --format.')
+
+        subjects = list(Subject.objects.all())
+        default_subject = None
+        if options['subject']:
+            lookup = options['subject']
+            default_subject = next(
+                (subject for subject in subjects if str(subject.id) == lookup or subject.code.lower() == lookup.lower()),
+                None
+            )
+            if not default_subject:
+                raise CommandError(f'Subject {lookup} not found.')
+
+        teacher = None
+        if options['teacher']:
+            teacher = Teacher.objects.filter(employee_id=options['teacher']).first()
+            if not teacher:
+                raise CommandError(f"Teacher {options['teacher']} not found.")
+
+        started = time.monotonic()
+        with open(path, encoding='utf-8-sig', errors='replace', newline='') as lines:
+            created, errors = QuestionBank.objects.import_questions(
+                lines, format, subjects,
+                default_subject=default_subject, created_by=teacher, batch_size=options['batch_size']
+            )
+        elapsed = time.monotonic() - started
+
+        for line_number, error in errors:
+            self.stderr.write(f'Line {line_number}: {error}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Done in {elapsed:.2f}s: {created} questions imported, {len(errors)} rows skipped'
+        ))
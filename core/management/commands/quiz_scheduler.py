@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from core.models import *
+
+class Command(BaseCommand):
+    help = 'Start and end scheduled quizzes on time and auto-submit expired attempts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help='Keep running instead of doing a single pass')
+        parser.add_argument('--interval', type=int, default=30, help='Seconds between passes when looping (default 30)')
+
+    def handle(self, *args, **options):
+        while True:
+            started, ended = Quiz.objects.advance_schedule()
+            closed = QuizAttempt.objects.close_expired()
+
+            if started or ended or closed or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{timezone.now():%Y-%m-%d %H:%M:%S} quizzes started: {started}, ended: {ended}; attempts auto-submitted: {closed}'
+                ))
+
+            if not options['loop']:
+                break
+            time.sleep(max(options['interval'], 1))
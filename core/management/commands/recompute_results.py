@@ -0,0 +1,45 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from core.models import *
+
+class Command(BaseCommand):
+    help = 'Recalculate result totals and grades from component scores in bulk'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--term', type=int, help='Term ID (defaults to the active term)')
+        parser.add_argument('--class', dest='school_class', type=int, help='Only recompute this class ID')
+        parser.add_argument('--subject', help='Only recompute this subject (ID or code)')
+
+    def handle(self, *args, **options):
+        if options['term']:
+            term = Term.objects.filter(id=options['term']).first()
+        else:
+            term = Term.objects.filter(is_active=True).first()
+        if not term:
+            raise CommandError('Term not found. Pass --term or set an active term.')
+
+        school_class = None
+        if options['school_class']:
+            school_class = SchoolClass.objects.filter(id=options['school_class']).first()
+            if not school_class:
+                raise CommandError(f"Class {options['school_class']} not found.")
+
+        subject = None
+        if options['subject']:
+            lookup = options['subject']
+            if lookup.isdigit():
+                subject = Subject.objects.filter(id=lookup).first()
+            else:
+                subject = Subject.objects.filter(code__iexact=lookup).first()
+            if not subject:
+                raise CommandError(f'Subject {lookup} not found.')
+
+        self.stdout.write(f'Recomputing results for {term}...')
+        started = time.monotonic()
+        created, updated = Result.objects.recompute(term, school_class=school_class, subject=subject)
+        elapsed = time.monotonic() - started
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Done in {elapsed:.2f}s: {created} results created, {updated} updated'
+        ))
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand, CommandError
+from core.models import *
+
+class Command(BaseCommand):
+    help = 'Copy graded quiz scores into their linked result components and recompute results'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--quiz', type=int, help='Only sync this quiz ID (defaults to every linked quiz)')
+        parser.add_argument('--term', type=int, help='Term ID (defaults to the term the quiz started in)')
+
+    def handle(self, *args, **options):
+        term = None
+        if options['term']:
+            term = Term.objects.filter(id=options['term']).first()
+            if not term:
+                raise CommandError(f"Term {options['term']} not found.")
+
+        quizzes = Quiz.objects.filter(resultcomponent__isnull=False).distinct()
+        if options['quiz']:
+            quizzes = quizzes.filter(id=options['quiz'])
+            if not quizzes.exists():
+                raise CommandError(f"Quiz {options['quiz']} not found or not linked to a result component.")
+
+        total = 0
+        for quiz in quizzes:
+            written = ComponentResult.objects.sync_quiz(quiz, term=term)
+            self.stdout.write(f'{quiz}: {written} component scores updated')
+            total += written
+
+        self.stdout.write(self.style.SUCCESS(f'Done: {total} component scores updated'))
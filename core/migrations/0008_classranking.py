@@ -0,0 +1,34 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_psychomotor_effectivedomain'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClassRanking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('average', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('position', models.IntegerField(default=0)),
+                ('class_size', models.IntegerField(default=0)),
+                ('class_highest', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('class_lowest', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('class_average', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('school_class', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.schoolclass')),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.student')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.term')),
+            ],
+            options={
+                'ordering': ['position'],
+                'unique_together': {('student', 'term')},
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:35
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_classranking'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentTermSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('average', models.DecimalField(decimal_places=2, default=0, max_digits=5)),
+                ('failures', models.IntegerField(default=0)),
+                ('subjects_taken', models.IntegerField(default=0)),
+                ('attendance_percentage', models.DecimalField(blank=True, decimal_places=2, max_digits=5, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.student')),
+                ('term', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.term')),
+            ],
+            options={
+                'unique_together': {('student', 'term')},
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:43
+
+import core.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0012_quiz_content_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quizattempt',
+            name='shuffle_seed',
+            field=models.PositiveIntegerField(default=core.models.generate_shuffle_seed),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_quizattempt_shuffle_seed'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quiz',
+            name='status',
+            field=models.CharField(choices=[('draft', 'Draft'), ('scheduled', 'Scheduled'), ('live', 'Live'), ('ended', 'Ended')], db_index=True, default='draft', max_length=20),
+        ),
+    ]
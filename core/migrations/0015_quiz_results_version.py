@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0014_alter_quiz_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='quiz',
+            name='results_version',
+            field=models.PositiveIntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,52 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:49
+
+import html
+
+from django.db import migrations, models
+from django.db.utils import OperationalError
+from django.utils.html import strip_tags
+
+
+FTS_TABLE = 'core_questionbank_fts'
+
+
+def build_search_index(apps, schema_editor):
+    QuestionBank = apps.get_model('core', 'QuestionBank')
+
+    questions = []
+    for question in QuestionBank.objects.all():
+        parts = [question.question_text, question.option_a, question.option_b, question.option_c, question.option_d]
+        question.search_text = ' '.join(filter(None, (' '.join(html.unescape(strip_tags(part or '')).split()) for part in parts)))
+        questions.append(question)
+    QuestionBank.objects.bulk_update(questions, ['search_text'], batch_size=500)
+
+    # FTS5 is SQLite only; other databases fall back to icontains on search_text
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    try:
+        schema_editor.execute(f'CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(search_text)')
+    except OperationalError:
+        # SQLite built without FTS5
+        return
+    schema_editor.execute(f'INSERT INTO {FTS_TABLE} (rowid, search_text) SELECT id, search_text FROM core_questionbank')
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {FTS_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_quiz_results_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='questionbank',
+            name='search_text',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(build_search_index, drop_search_index),
+    ]
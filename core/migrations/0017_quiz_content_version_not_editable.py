@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0016_questionbank_search_text'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quiz',
+            name='content_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
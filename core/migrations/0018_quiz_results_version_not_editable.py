@@ -0,0 +1,18 @@
+# Generated by Django 4.2.7 on 2026-10-18 03:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0017_quiz_content_version_not_editable'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='quiz',
+            name='results_version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -1,8 +1,23 @@
-from django.db import models
+from django.db import models, transaction, connection, IntegrityError
+from django.db.models import F, Q, Sum, Avg, Count, Max, FloatField, DecimalField, ExpressionWrapper, Case, When, Value, Exists, OuterRef, Subquery
+from django.db.models.functions import Cast, Coalesce
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
 from django.contrib.auth.models import AbstractUser
+from django.core.cache import cache
 from django.utils import timezone
+from django.utils.html import format_html, strip_tags
+from django.utils.safestring import mark_safe
 from ckeditor.fields import RichTextField
+from bisect import bisect_right
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from decimal import Decimal
+import csv
+import html
 import json
+import random
+import re
 import secrets
 
 class User(AbstractUser):
@@ -48,6 +63,284 @@ class GradingSystem(models.Model):
     def __str__(self):
         return f"{self.grade} ({self.min_score}-{self.max_score})"
 
+    # Process-wide band index: (sorted min scores, bands in the same order)
+    _band_index = None
+
+    @classmethod
+    def band_index(cls):
+        index = cls._band_index
+        if index is None:
+            bands = sorted(cls.objects.all(), key=lambda band: band.min_score)
+            index = ([band.min_score for band in bands], bands)
+            cls._band_index = index
+        return index
+
+    @classmethod
+    def clear_band_index(cls):
+        cls._band_index = None
+
+    @classmethod
+    def for_score(cls, score):
+        """
+        Return the band for a score without hitting the database.
+
+        A score belongs to the band with the highest min_score not above it, so
+        fractional totals such as 89.5 fall into the 80-89 band instead of the
+        gap before 90.
+        """
+        if score is None:
+            return None
+        min_scores, bands = cls.band_index()
+        idx = bisect_right(min_scores, score) - 1
+        if idx < 0:
+            return None
+        return bands[idx]
+
+@receiver(post_save, sender=GradingSystem)
+@receiver(post_delete, sender=GradingSystem)
+def invalidate_grading_bands(sender, **kwargs):
+    GradingSystem.clear_band_index()
+
+class QuestionBankManager(models.Manager):
+    PAGE_SIZE = 25
+
+    # Whether the SQLite FTS5 index exists, checked once per process
+    _fts_available = None
+
+    @property
+    def fts_table(self):
+        return f'{self.model._meta.db_table}_fts'
+
+    def fts_available(self):
+        if QuestionBankManager._fts_available is None:
+            QuestionBankManager._fts_available = (
+                connection.vendor == 'sqlite' and self.fts_table in connection.introspection.table_names()
+            )
+        return QuestionBankManager._fts_available
+
+    def index(self, questions):
+        """Write the search text of the given questions into the FTS index."""
+        if not self.fts_available():
+            return
+        rows = [(question.id, question.search_text) for question in questions]
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.fts_table} WHERE rowid = %s', [(row[0],) for row in rows])
+            cursor.executemany(f'INSERT INTO {self.fts_table} (rowid, search_text) VALUES (%s, %s)', rows)
+
+    def unindex(self, question_ids):
+        if not self.fts_available():
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(f'DELETE FROM {self.fts_table} WHERE rowid = %s', [(question_id,) for question_id in question_ids])
+
+    def search(self, query='', after=None):
+        """
+        Questions matching every word of query, in keyset-paginated order.
+
+        With the FTS5 index, matches are ranked by relevance (bm25) then id;
+        elsewhere each word is matched with icontains on search_text and the
+        newest questions come first. after is a cursor from cursor_for().
+        """
+        words = re.findall(r'\w+', query or '')
+        table = self.fts_table
+        db_table = self.model._meta.db_table
+
+        if words and self.fts_available():
+            match = ' '.join(f'"{word}"*' for word in words)
+            questions = self.extra(
+                select={'search_rank': f'{table}.rank'},
+                tables=[table],
+                where=[f'{table}.rowid = {db_table}.id', f'{table} MATCH %s'],
+                params=[match]
+            ).order_by('search_rank', 'id')
+            if after and ':' in after:
+                rank, _, question_id = after.partition(':')
+                try:
+                    rank, question_id = float(rank), int(question_id)
+                except ValueError:
+                    return questions
+                questions = questions.extra(
+                    where=[f'({table}.rank > %s OR ({table}.rank = %s AND {db_table}.id > %s))'],
+                    params=[rank, rank, question_id]
+                )
+            return questions
+
+        questions = self.all()
+        for word in words:
+            questions = questions.filter(search_text__icontains=word)
+        questions = questions.order_by('-id')
+        if after and after.isdigit():
+            questions = questions.filter(id__lt=int(after))
+        return questions
+
+    IMPORT_BATCH_SIZE = 1000
+    IMPORT_FIELDS = ['question_text', 'option_a', 'option_b', 'option_c', 'option_d']
+
+    def import_questions(self, lines, format, subjects, default_subject=None, created_by=None, batch_size=None):
+        """
+        Stream questions from an iterable of text lines into the bank.
+
+        format is 'csv', 'jsonl' or 'aiken'. Rows are validated one at a time and
+        inserted with bulk_create every batch_size rows, so memory stays bounded
+        however long the file is. A bad row is reported and skipped rather than
+        aborting the import. subjects limits which subjects rows may use (looked
+        up by code or id); rows without one use default_subject.
+        Returns a (created, errors) tuple, errors being (line, message) pairs.
+        """
+        parsers = {'csv': parse_question_csv, 'jsonl': parse_question_jsonl, 'aiken': parse_question_aiken}
+        if format not in parsers:
+            raise ValueError(f'Unknown import format: {format}')
+        batch_size = batch_size or self.IMPORT_BATCH_SIZE
+
+        subjects_by_key = {}
+        for subject in subjects:
+            subjects_by_key[subject.code.lower()] = subject
+            subjects_by_key[str(subject.id)] = subject
+        difficulties = {value for value, label in self.model._meta.get_field('difficulty').choices}
+
+        created = 0
+        errors = []
+        batch = []
+
+        def flush():
+            with transaction.atomic():
+                self.bulk_create(batch)
+                self.index(batch)
+            return len(batch)
+
+        for line_number, row, error in parsers[format](lines):
+            if error is None:
+                row = {key.strip().lower(): (value.strip() if isinstance(value, str) else value) for key, value in row.items() if key}
+                missing = [field for field in self.IMPORT_FIELDS if not row.get(field)]
+                correct_answer = str(row.get('correct_answer') or '').upper()
+                difficulty = str(row.get('difficulty') or 'medium').lower()
+                subject = subjects_by_key.get(str(row.get('subject') or '').lower()) if row.get('subject') else default_subject
+
+                if missing:
+                    error = f"Missing {', '.join(missing)}"
+                elif correct_answer not in ['A', 'B', 'C', 'D']:
+                    error = f"Correct answer must be A, B, C or D, got '{row.get('correct_answer') or ''}'"
+                elif difficulty not in difficulties:
+                    error = f"Unknown difficulty '{difficulty}'"
+                elif subject is None:
+                    error = f"Unknown subject '{row.get('subject')}'" if row.get('subject') else 'No subject given'
+
+            if error is not None:
+                errors.append((line_number, error))
+                continue
+
+            question = self.model(
+                subject=subject,
+                correct_answer=correct_answer,
+                difficulty=difficulty,
+                created_by=created_by,
+                **{field: str(row[field]) for field in self.IMPORT_FIELDS}
+            )
+            question.search_text = question.build_search_text()
+            batch.append(question)
+            if len(batch) >= batch_size:
+                created += flush()
+                batch = []
+
+        if batch:
+            created += flush()
+        return created, errors
+
+    def sample(self, subject, recipe):
+        """
+        Random question ids per difficulty, e.g. recipe={'easy': 20, 'hard': 5}.
+
+        Sampling happens in the database and only ids are fetched, so the bank
+        is never loaded. Raises ValueError if a difficulty doesn't have enough
+        questions.
+        """
+        difficulties = dict(self.model._meta.get_field('difficulty').choices)
+        question_ids = []
+        shortages = []
+        for difficulty, count in recipe.items():
+            if difficulty not in difficulties:
+                raise ValueError(f'Unknown difficulty: {difficulty}')
+            if count <= 0:
+                continue
+            sampled = list(
+                self.filter(subject=subject, difficulty=difficulty).order_by('?').values_list('id', flat=True)[:count]
+            )
+            if len(sampled) < count:
+                shortages.append(f'{count} {difficulty} requested, {len(sampled)} available')
+            question_ids.extend(sampled)
+        if shortages:
+            raise ValueError(f"Not enough {subject.name} questions: {'; '.join(shortages)}")
+        return question_ids
+
+    def cursor_for(self, question):
+        """Cursor that makes search() continue after this question."""
+        if getattr(question, 'search_rank', None) is not None:
+            return f'{question.search_rank!r}:{question.id}'
+        return str(question.id)
+
+def parse_question_csv(lines):
+    """Yield (line, row, error) from CSV with question_text, option_a-d, correct_answer columns."""
+    reader = csv.DictReader(lines)
+    for row in reader:
+        if None in row:
+            yield reader.line_num, None, 'Too many columns'
+        else:
+            yield reader.line_num, row, None
+
+def parse_question_jsonl(lines):
+    """Yield (line, row, error) from JSON lines, one question object per line."""
+    for line_number, line in enumerate(lines, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+        except ValueError as e:
+            yield line_number, None, f'Invalid JSON: {e}'
+            continue
+        if isinstance(row, dict):
+            yield line_number, row, None
+        else:
+            yield line_number, None, 'Expected a JSON object'
+
+AIKEN_OPTION = re.compile(r'^([A-Z])[.)]\s+(.*)$')
+
+def parse_question_aiken(lines):
+    """
+    Yield (line, row, error) from Aiken format: the question text, one option
+    per line as 'A. text' or 'A) text', then 'ANSWER: B'.
+    """
+    question_lines = []
+    options = {}
+    start = None
+
+    for line_number, line in enumerate(lines, 1):
+        line = line.strip()
+        if not line:
+            continue
+        option = AIKEN_OPTION.match(line)
+
+        if line.upper().startswith('ANSWER:') and question_lines:
+            row = {'question_text': '\n'.join(question_lines), 'correct_answer': line.split(':', 1)[1].strip()}
+            if set(options) - set('ABCD'):
+                yield start, None, 'Only options A-D are supported'
+            else:
+                row.update({f'option_{letter.lower()}': text for letter, text in options.items()})
+                yield start, row, None
+            question_lines, options, start = [], {}, None
+        elif option and question_lines:
+            options[option.group(1)] = option.group(2)
+        else:
+            if options:
+                # Text after the options means the previous question never got its ANSWER line
+                yield start, None, 'Missing ANSWER line'
+                question_lines, options = [], {}
+            if not question_lines:
+                start = line_number
+            question_lines.append(line)
+
+    if question_lines:
+        yield start, None, 'Missing ANSWER line'
+
 class QuestionBank(models.Model):
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
     question_text = RichTextField()
@@ -59,10 +352,30 @@ class QuestionBank(models.Model):
     difficulty = models.CharField(max_length=10, choices=[('easy', 'Easy'), ('medium', 'Medium'), ('hard', 'Hard')], default='medium')
     created_by = models.ForeignKey('Teacher', on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Plain text of the question and options, for searching
+    search_text = models.TextField(blank=True, editable=False)
+
+    objects = QuestionBankManager()
 
     def __str__(self):
         return f"{self.subject.code} - {self.question_text[:50]}"
 
+    def build_search_text(self):
+        parts = [self.question_text, self.option_a, self.option_b, self.option_c, self.option_d]
+        return ' '.join(filter(None, (' '.join(html.unescape(strip_tags(part or '')).split()) for part in parts)))
+
+    def save(self, *args, **kwargs):
+        self.search_text = self.build_search_text()
+        super().save(*args, **kwargs)
+
+@receiver(post_save, sender=QuestionBank)
+def index_bank_question(sender, instance, **kwargs):
+    QuestionBank.objects.index([instance])
+
+@receiver(post_delete, sender=QuestionBank)
+def unindex_bank_question(sender, instance, **kwargs):
+    QuestionBank.objects.unindex([instance.id])
+
 class ResultComponent(models.Model):
     school_class = models.ForeignKey(SchoolClass, on_delete=models.CASCADE)
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
@@ -116,6 +429,76 @@ class Term(models.Model):
     def __str__(self):
         return self.name
 
+class ResultTokenManager(models.Manager):
+    MAX_BATCH_RETRIES = 5
+
+    def generate_for_term(self, term, max_uses=3, students=None, batch_size=500):
+        """
+        Create tokens for every student without one for the term.
+
+        Missing students are found in one query and tokens are inserted with
+        bulk_create per batch. If a batch hits a unique collision only that
+        batch is regenerated. Returns the number of tokens created.
+        """
+        missing = Student.objects.exclude(resulttoken__term=term)
+        if students is not None:
+            missing = missing.filter(id__in=students)
+        student_ids = list(missing.order_by('id').values_list('id', flat=True))
+
+        created = 0
+        for start in range(0, len(student_ids), batch_size):
+            batch = student_ids[start:start + batch_size]
+            for attempt in range(self.MAX_BATCH_RETRIES):
+                tokens = set()
+                while len(tokens) < len(batch):
+                    tokens.add(ResultToken.generate_token())
+                try:
+                    with transaction.atomic():
+                        self.bulk_create([
+                            self.model(student_id=student_id, term=term, token=token, max_uses=max_uses)
+                            for student_id, token in zip(batch, tokens)
+                        ])
+                except IntegrityError:
+                    # A token collided, or another run already covered some students
+                    batch = list(
+                        Student.objects.filter(id__in=batch)
+                        .exclude(resulttoken__term=term)
+                        .values_list('id', flat=True)
+                    )
+                    if not batch:
+                        break
+                    if attempt == self.MAX_BATCH_RETRIES - 1:
+                        raise
+                else:
+                    created += len(batch)
+                    break
+        return created
+
+    def redeem(self, token):
+        """
+        Consume one use of a token with a single conditional UPDATE.
+        Returns True if a use was available, so concurrent clicks can't overrun max_uses.
+        """
+        redeemed = self.filter(token=token, uses_count__lt=F('max_uses')).update(
+            uses_count=F('uses_count') + 1
+        )
+        # Drop the cached lookup once the token can't be used again, including
+        # when this redeem took the last use
+        if not redeemed or self.filter(token=token, uses_count__gte=F('max_uses')).exists():
+            ResultToken.forget(token)
+        return redeemed == 1
+
+    def lookup(self, token):
+        """Return (student_id, term_id) for a token, cached briefly across result card loads."""
+        key = ResultToken.cache_key(token)
+        ids = cache.get(key)
+        if ids is None:
+            ids = self.filter(token=token).values_list('student_id', 'term_id').first()
+            if ids is None:
+                return None
+            cache.set(key, ids, ResultToken.CACHE_TIMEOUT)
+        return ids
+
 class ResultToken(models.Model):
     student = models.ForeignKey('Student', on_delete=models.CASCADE)
     term = models.ForeignKey(Term, on_delete=models.CASCADE)
@@ -124,24 +507,44 @@ class ResultToken(models.Model):
     uses_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     
+    objects = ResultTokenManager()
+    
+    CACHE_TIMEOUT = 300
+    
     class Meta:
         unique_together = ['student', 'term']
     
+    @staticmethod
+    def generate_token():
+        return secrets.token_urlsafe(12)[:12].upper()
+    
+    @staticmethod
+    def cache_key(token):
+        return f'result_token:{token}'
+    
+    @classmethod
+    def forget(cls, token):
+        cache.delete(cls.cache_key(token))
+    
     def save(self, *args, **kwargs):
         if not self.token:
-            self.token = secrets.token_urlsafe(12)[:12].upper()
+            self.token = self.generate_token()
         super().save(*args, **kwargs)
     
     def can_use(self):
         return self.uses_count < self.max_uses
     
     def use_token(self):
-        if self.can_use():
+        if ResultToken.objects.redeem(self.token):
             self.uses_count += 1
-            self.save()
             return True
         return False
 
+@receiver(post_save, sender=ResultToken)
+@receiver(post_delete, sender=ResultToken)
+def invalidate_result_token(sender, instance, **kwargs):
+    ResultToken.forget(instance.token)
+
 class Attendance(models.Model):
     student = models.ForeignKey('Student', on_delete=models.CASCADE)
     term = models.ForeignKey(Term, on_delete=models.CASCADE)
@@ -219,6 +622,62 @@ class SchoolSettings(models.Model):
     def __str__(self):
         return self.school_name
 
+class ComponentResultManager(models.Manager):
+    def sync_quiz(self, quiz, term=None):
+        """
+        Copy graded quiz scores into every ResultComponent linked to the quiz.
+
+        Each final_score (a percentage) is scaled to the component's max_score.
+        Only rows that are new or whose score changed are upserted, in one
+        batch per component, and the affected results are then recomputed.
+        term defaults to the term the quiz started in, else the active term.
+        Returns the number of component scores written.
+        """
+        if term is None:
+            quiz_date = timezone.localtime(quiz.start_time).date()
+            term = (
+                Term.objects.filter(start_date__lte=quiz_date, end_date__gte=quiz_date).first()
+                or Term.objects.filter(is_active=True).first()
+            )
+        if term is None:
+            return 0
+
+        now = timezone.now()
+        written = 0
+        for component in ResultComponent.objects.filter(linked_quiz=quiz):
+            scores = QuizAttempt.objects.filter(
+                quiz=quiz, is_submitted=True, is_graded=True,
+                student__school_class_id=component.school_class_id
+            ).values_list('student_id', 'final_score')
+            existing = dict(self.filter(component=component, term=term).values_list('student_id', 'score'))
+
+            changed = []
+            for student_id, final_score in scores:
+                score = (final_score * component.max_score / 100).quantize(Decimal('0.01'))
+                if existing.get(student_id) != score:
+                    changed.append(self.model(
+                        student_id=student_id, component=component, term=term, score=score, updated_at=now
+                    ))
+            if not changed:
+                continue
+
+            with transaction.atomic():
+                self.bulk_create(
+                    changed,
+                    batch_size=500,
+                    update_conflicts=True,
+                    unique_fields=['student', 'component', 'term'],
+                    update_fields=['score', 'updated_at']
+                )
+                Result.objects.recompute(
+                    term,
+                    school_class=component.school_class,
+                    subject=component.subject,
+                    students=[result.student_id for result in changed]
+                )
+            written += len(changed)
+        return written
+
 class ComponentResult(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     component = models.ForeignKey(ResultComponent, on_delete=models.CASCADE)
@@ -227,9 +686,83 @@ class ComponentResult(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ComponentResultManager()
+
     class Meta:
         unique_together = ['student', 'component', 'term']
 
+class ResultManager(models.Manager):
+    def recompute(self, term, school_class=None, subject=None, students=None):
+        """
+        Recalculate totals and grades for every result in a term in bulk.
+
+        Weighted component scores are summed with one grouped query per class,
+        mapped to grades in memory and written back with bulk_create/bulk_update
+        inside a single transaction. Returns a (created, updated) tuple.
+        """
+        if school_class is not None:
+            classes = [school_class]
+        else:
+            classes = SchoolClass.objects.all()
+
+        now = timezone.now()
+        weighted_score = ExpressionWrapper(
+            Cast('score', FloatField()) * F('component__weight') / F('component__max_score'),
+            output_field=FloatField()
+        )
+
+        created_count = 0
+        updated_count = 0
+
+        with transaction.atomic():
+            for cls in classes:
+                component_results = ComponentResult.objects.filter(
+                    term=term,
+                    student__school_class=cls,
+                    component__school_class=cls
+                )
+                results = self.filter(term=term, student__school_class=cls)
+                if subject is not None:
+                    component_results = component_results.filter(component__subject=subject)
+                    results = results.filter(subject=subject)
+                if students is not None:
+                    component_results = component_results.filter(student__in=students)
+                    results = results.filter(student__in=students)
+
+                totals = {
+                    (row['student_id'], row['component__subject_id']): row['total'] or 0
+                    for row in component_results.values(
+                        'student_id', 'component__subject_id'
+                    ).annotate(total=Sum(weighted_score)).order_by()
+                }
+
+                to_update = []
+                for result in results:
+                    total = totals.pop((result.student_id, result.subject_id), 0)
+                    if result.apply_total(total):
+                        result.updated_at = now
+                        to_update.append(result)
+
+                to_create = []
+                for (student_id, subject_id), total in totals.items():
+                    result = self.model(student_id=student_id, subject_id=subject_id, term=term)
+                    result.apply_total(total)
+                    to_create.append(result)
+
+                self.bulk_create(to_create, batch_size=500)
+                self.bulk_update(
+                    to_update,
+                    ['total_score', 'grade', 'grade_point', 'remark', 'updated_at'],
+                    batch_size=500
+                )
+                if to_create or to_update:
+                    ClassRanking.objects.refresh(cls, term)
+                    StudentTermSummary.objects.refresh(cls, term)
+                created_count += len(to_create)
+                updated_count += len(to_update)
+
+        return created_count, updated_count
+
 class Result(models.Model):
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
     subject = models.ForeignKey(Subject, on_delete=models.CASCADE)
@@ -241,36 +774,255 @@ class Result(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = ResultManager()
+
     class Meta:
         unique_together = ['student', 'subject', 'term']
 
+    def apply_total(self, total):
+        """Set total and grade fields in memory. Returns True if anything changed."""
+        total_score = Decimal(str(round(total, 2)))
+        grade, grade_point, remark = self.grade, self.grade_point, self.remark
+
+        band = GradingSystem.for_score(total_score)
+        if band:
+            grade, grade_point, remark = band.grade, band.grade_point, band.remark
+
+        changed = (
+            self.total_score != total_score or self.grade != grade or
+            self.grade_point != grade_point or self.remark != remark
+        )
+        self.total_score = total_score
+        self.grade = grade
+        self.grade_point = grade_point
+        self.remark = remark
+        return changed
+
     def calculate_total(self):
         components = ComponentResult.objects.filter(
             student=self.student,
             component__subject=self.subject,
             component__school_class=self.student.school_class,
             term=self.term
-        )
+        ).select_related('component')
         
         total = 0
         for comp_result in components:
             weighted_score = (comp_result.score / comp_result.component.max_score) * comp_result.component.weight
             total += weighted_score
         
-        self.total_score = total
-        
-        grading = GradingSystem.objects.filter(
-            min_score__lte=total,
-            max_score__gte=total
-        ).first()
-        
-        if grading:
-            self.grade = grading.grade
-            self.grade_point = grading.grade_point
-            self.remark = grading.remark
-        
+        self.apply_total(total)
         self.save()
 
+class ClassRankingManager(models.Manager):
+    def refresh(self, school_class, term):
+        """
+        Rebuild the ranking rows for one class and term from a single grouped
+        Result query. Students with equal averages share a position.
+        """
+        averages = Result.objects.filter(
+            student__school_class=school_class,
+            term=term
+        ).values('student').annotate(avg=Avg('total_score')).order_by('-avg')
+        averages = [(row['student'], Decimal(str(round(row['avg'] or 0, 2)))) for row in averages]
+        class_size = Student.objects.filter(school_class=school_class).count()
+
+        rankings = []
+        if averages:
+            values = [avg for _, avg in averages]
+            class_highest = values[0]
+            class_lowest = values[-1]
+            class_average = Decimal(str(round(sum(values) / len(values), 2)))
+            position = 0
+            previous = None
+            for idx, (student_id, avg) in enumerate(averages, 1):
+                if avg != previous:
+                    position = idx
+                    previous = avg
+                rankings.append(self.model(
+                    student_id=student_id,
+                    term_id=getattr(term, 'pk', term),
+                    school_class_id=getattr(school_class, 'pk', school_class),
+                    average=avg,
+                    position=position,
+                    class_size=class_size,
+                    class_highest=class_highest,
+                    class_lowest=class_lowest,
+                    class_average=class_average
+                ))
+
+        with transaction.atomic():
+            self.filter(school_class=school_class, term=term).exclude(
+                student__in=[ranking.student_id for ranking in rankings]
+            ).delete()
+            self.bulk_create(
+                rankings,
+                update_conflicts=True,
+                unique_fields=['student', 'term'],
+                update_fields=[
+                    'school_class', 'average', 'position', 'class_size',
+                    'class_highest', 'class_lowest', 'class_average', 'updated_at'
+                ],
+                batch_size=500
+            )
+        return rankings
+
+    def refresh_term(self, term):
+        for school_class in SchoolClass.objects.all():
+            self.refresh(school_class, term)
+
+class ClassRanking(models.Model):
+    """Precomputed class position and class statistics for a student in a term."""
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    term = models.ForeignKey(Term, on_delete=models.CASCADE)
+    school_class = models.ForeignKey(SchoolClass, on_delete=models.CASCADE)
+    average = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    position = models.IntegerField(default=0)
+    class_size = models.IntegerField(default=0)
+    class_highest = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    class_lowest = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    class_average = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = ClassRankingManager()
+
+    class Meta:
+        unique_together = ['student', 'term']
+        ordering = ['position']
+
+    def __str__(self):
+        return f"{self.student} - {self.term} (#{self.position} of {self.class_size})"
+
+class StudentTermSummaryManager(models.Manager):
+    def refresh(self, school_class, term, students=None):
+        """
+        Rebuild term summaries for a class (optionally only some students) from
+        one grouped Result aggregate and one Attendance query.
+        """
+        class_students = Student.objects.filter(school_class=school_class)
+        if students is not None:
+            class_students = class_students.filter(id__in=students)
+        student_ids = list(class_students.values_list('id', flat=True))
+
+        aggregates = {
+            row['student']: row
+            for row in Result.objects.filter(
+                student__in=student_ids,
+                term=term
+            ).values('student').annotate(
+                avg=Avg('total_score'),
+                subjects=Count('id'),
+                failures=Count('id', filter=Q(total_score__lt=F('subject__pass_mark')))
+            ).order_by()
+        }
+        attendance = {
+            student_id: (days_present / total_days * 100) if total_days > 0 else 0
+            for student_id, days_present, total_days in Attendance.objects.filter(
+                student__in=student_ids,
+                term=term
+            ).values_list('student_id', 'days_present', 'total_days')
+        }
+
+        summaries = []
+        for student_id in student_ids:
+            row = aggregates.get(student_id, {})
+            percentage = attendance.get(student_id)
+            summaries.append(self.model(
+                student_id=student_id,
+                term_id=getattr(term, 'pk', term),
+                average=Decimal(str(round(row.get('avg') or 0, 2))),
+                failures=row.get('failures', 0),
+                subjects_taken=row.get('subjects', 0),
+                attendance_percentage=None if percentage is None else Decimal(str(round(percentage, 2)))
+            ))
+
+        self.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=['student', 'term'],
+            update_fields=['average', 'failures', 'subjects_taken', 'attendance_percentage', 'updated_at'],
+            batch_size=500
+        )
+        return summaries
+
+class StudentTermSummary(models.Model):
+    """Per-student term average, failures and attendance used for promotion."""
+    PROMOTION_MIN_AVERAGE = 50
+    PROMOTION_MAX_FAILURES = 2
+    PROMOTION_MIN_ATTENDANCE = 75
+
+    student = models.ForeignKey(Student, on_delete=models.CASCADE)
+    term = models.ForeignKey(Term, on_delete=models.CASCADE)
+    average = models.DecimalField(max_digits=5, decimal_places=2, default=0)
+    failures = models.IntegerField(default=0)
+    subjects_taken = models.IntegerField(default=0)
+    attendance_percentage = models.DecimalField(max_digits=5, decimal_places=2, null=True, blank=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    objects = StudentTermSummaryManager()
+
+    class Meta:
+        unique_together = ['student', 'term']
+
+    def __str__(self):
+        return f"{self.student} - {self.term}"
+
+    @property
+    def is_eligible_for_promotion(self):
+        # Missing attendance records don't block promotion
+        attendance_ok = (
+            self.attendance_percentage is None or
+            self.attendance_percentage >= self.PROMOTION_MIN_ATTENDANCE
+        )
+        return (
+            self.average >= self.PROMOTION_MIN_AVERAGE and
+            self.failures <= self.PROMOTION_MAX_FAILURES and
+            attendance_ok
+        )
+
+def student_class_id(student_id):
+    return Student.objects.filter(id=student_id).values_list('school_class_id', flat=True).first()
+
+@receiver(post_save, sender=Result)
+@receiver(post_delete, sender=Result)
+def refresh_result_aggregates(sender, instance, **kwargs):
+    school_class_id = student_class_id(instance.student_id)
+    if school_class_id:
+        student_id, term_id = instance.student_id, instance.term_id
+        transaction.on_commit(lambda: ClassRanking.objects.refresh(school_class_id, term_id))
+        transaction.on_commit(lambda: StudentTermSummary.objects.refresh(school_class_id, term_id, students=[student_id]))
+
+@receiver(post_save, sender=Attendance)
+@receiver(post_delete, sender=Attendance)
+def refresh_attendance_summary(sender, instance, **kwargs):
+    school_class_id = student_class_id(instance.student_id)
+    if school_class_id:
+        student_id, term_id = instance.student_id, instance.term_id
+        transaction.on_commit(lambda: StudentTermSummary.objects.refresh(school_class_id, term_id, students=[student_id]))
+
+@receiver(post_save, sender=Term)
+def refresh_published_term_rankings(sender, instance, **kwargs):
+    if instance.result_published:
+        transaction.on_commit(lambda: ClassRanking.objects.refresh_term(instance))
+
+class QuizManager(models.Manager):
+    def advance_schedule(self, now=None):
+        """
+        Move scheduled quizzes to live once they start, and scheduled or live
+        quizzes to ended once they finish. Returns a (started, ended) tuple.
+        """
+        now = now or timezone.now()
+
+        starting = list(self.filter(status='scheduled', start_time__lte=now, end_time__gt=now).values_list('id', flat=True))
+        started = self.filter(id__in=starting, status='scheduled').update(status='live')
+        ended = self.filter(status__in=['scheduled', 'live'], end_time__lte=now).update(status='ended')
+
+        # update() skips the post_save receiver, so build the papers here
+        for quiz in self.filter(id__in=starting, status='live'):
+            quiz.compiled_paper()
+            quiz.answer_key()
+        return started, ended
+
 class Quiz(models.Model):
     STATUS_CHOICES = [
         ('draft', 'Draft'),
@@ -286,7 +1038,7 @@ class Quiz(models.Model):
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
     duration_minutes = models.IntegerField(default=60)
-    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='draft', db_index=True)
     instructions = models.TextField(blank=True)
     shuffle_questions = models.BooleanField(default=True)
     shuffle_options = models.BooleanField(default=True)
@@ -294,14 +1046,244 @@ class Quiz(models.Model):
     detect_tab_switching = models.BooleanField(default=True)
     max_tab_switches = models.IntegerField(default=3)
     created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped whenever a question changes, so cached question data can be keyed on it
+    content_version = models.PositiveIntegerField(default=0, editable=False)
+    # Bumped on every submission or regrade, so cached result statistics can be keyed on it
+    results_version = models.PositiveIntegerField(default=0, editable=False)
+
+    objects = QuizManager()
+
+    CACHE_TIMEOUT = 60 * 60 * 24
+    # Only ever changed through F() updates; a full save from a loaded instance
+    # would otherwise write back whatever number it was read with
+    VERSION_FIELDS = ('content_version', 'results_version')
 
     def __str__(self):
         return f"{self.title} - {self.school_class.name}"
 
+    def save(self, *args, **kwargs):
+        if self.pk and not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key and field.name not in self.VERSION_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
     def is_live(self):
         now = timezone.now()
         return self.status == 'live' or (self.status == 'scheduled' and self.start_time <= now <= self.end_time)
 
+    @classmethod
+    def bump_content_version(cls, quiz_id):
+        cls.objects.filter(id=quiz_id).update(content_version=F('content_version') + 1)
+
+    @classmethod
+    def bump_results_version(cls, quiz_id):
+        cls.objects.filter(id=quiz_id).update(results_version=F('results_version') + 1)
+
+    def add_bank_questions(self, bank_question_ids, max_marks=1):
+        """
+        Copy bank questions into this quiz as objective questions, in the given
+        order after the existing ones, with a single bulk_create. Returns the
+        new questions.
+        """
+        bank = QuestionBank.objects.only(
+            'id', 'question_text', 'option_a', 'option_b', 'option_c', 'option_d', 'correct_answer'
+        ).in_bulk(bank_question_ids)
+
+        with transaction.atomic():
+            # Lock the quiz so concurrent adds don't hand out the same order values
+            list(Quiz.objects.select_for_update().filter(id=self.id).values_list('id', flat=True))
+            next_order = (self.questions.aggregate(last=Max('order'))['last'] or 0) + 1
+            questions = []
+            for bank_question_id in bank_question_ids:
+                bank_question = bank.get(bank_question_id)
+                if bank_question is None:
+                    continue
+                questions.append(Question(
+                    quiz=self,
+                    question_type='objective',
+                    question_text=bank_question.question_text,
+                    option_a=bank_question.option_a,
+                    option_b=bank_question.option_b,
+                    option_c=bank_question.option_c,
+                    option_d=bank_question.option_d,
+                    correct_answer=bank_question.correct_answer,
+                    max_marks=max_marks,
+                    order=next_order + len(questions)
+                ))
+            Question.objects.bulk_create(questions)
+            # bulk_create skips the Question signals that normally bump the version
+            if questions:
+                Quiz.bump_content_version(self.id)
+        return questions
+
+    def answer_key(self):
+        """Map of question id to AnswerKeyEntry, cached per quiz content version."""
+        key = f'quiz_answer_key:{self.id}:{self.content_version}'
+        answer_key = cache.get(key)
+        if answer_key is None:
+            answer_key = {
+                question_id: AnswerKeyEntry(
+                    question_type,
+                    frozenset(correct_answer.split(',')) if correct_answer else frozenset(),
+                    max_marks
+                )
+                for question_id, question_type, correct_answer, max_marks in self.questions.values_list(
+                    'id', 'question_type', 'correct_answer', 'max_marks'
+                )
+            }
+            cache.set(key, answer_key, self.CACHE_TIMEOUT)
+        return answer_key
+
+    def compiled_paper(self):
+        """Question paper with rich text pre-rendered to HTML, cached per quiz content version.
+
+        Only the per-student parts (question order and saved answers) are left
+        for the view to apply.
+        """
+        key = f'quiz_paper:{self.id}:{self.content_version}'
+        paper = cache.get(key)
+        if paper is None:
+            paper = []
+            for question in self.questions.all():
+                options = []
+                if question.question_type in ['objective', 'multichoice']:
+                    for letter, text in zip('ABCD', [question.option_a, question.option_b, question.option_c, question.option_d]):
+                        options.append((letter, mark_safe(text)))
+                paper.append({
+                    'id': question.id,
+                    'question_type': question.question_type,
+                    'max_marks': question.max_marks,
+                    'html': format_html('<div class="text-gray-800 mb-4">{}</div>', mark_safe(question.question_text)),
+                    'options': options,
+                })
+            cache.set(key, paper, self.CACHE_TIMEOUT)
+        return paper
+
+    def item_analysis(self):
+        """
+        Per-question statistics over all submitted attempts, cached until the
+        questions change or an attempt is submitted or regraded.
+
+        Answers are loaded once into students x questions matrices and every
+        statistic is computed column-wise with NumPy:
+        difficulty (mean share of marks earned), discrimination (upper minus
+        lower 27% by total score), option counts for A-D and the point-biserial
+        correlation of each item with the rest of the paper.
+        """
+        key = f'quiz_item_analysis:{self.id}:{self.content_version}:{self.results_version}'
+        analysis = cache.get(key)
+        if analysis is not None:
+            return analysis
+
+        import numpy as np
+
+        answer_key = self.answer_key()
+        question_ids = [question['id'] for question in self.compiled_paper()]
+        attempt_ids = list(QuizAttempt.objects.filter(quiz=self, is_submitted=True).values_list('id', flat=True))
+        rows = {attempt_id: row for row, attempt_id in enumerate(attempt_ids)}
+        columns = {question_id: column for column, question_id in enumerate(question_ids)}
+
+        scores = np.zeros((len(attempt_ids), len(question_ids)))
+        choices = np.zeros((len(attempt_ids), len(question_ids), 4), dtype=bool)
+        answers = QuizAnswer.objects.filter(attempt__quiz=self, attempt__is_submitted=True).values_list(
+            'attempt_id', 'question_id', 'selected_answer', 'is_correct', 'manual_score'
+        )
+        for attempt_id, question_id, selected_answer, is_correct, manual_score in answers:
+            entry = answer_key.get(question_id)
+            # Attempts submitted after the id list was read aren't in the matrix
+            if entry is None or question_id not in columns or attempt_id not in rows:
+                continue
+            row, column = rows[attempt_id], columns[question_id]
+            if entry.is_auto_graded:
+                scores[row, column] = entry.max_marks if is_correct else 0
+                for letter in selected_answer.split(',') if selected_answer else []:
+                    if letter and letter in 'ABCD':
+                        choices[row, column, 'ABCD'.index(letter)] = True
+            else:
+                scores[row, column] = float(manual_score)
+
+        max_marks = np.array([answer_key[question_id].max_marks or 1 for question_id in question_ids], dtype=float)
+        student_count = len(attempt_ids)
+        totals = scores.sum(axis=1)
+
+        with np.errstate(invalid='ignore', divide='ignore'):
+            difficulty = scores.mean(axis=0) / max_marks if student_count else np.full(len(question_ids), np.nan)
+
+            # Upper and lower groups by total score, 27% each (at least one student)
+            group_size = max(1, int(round(student_count * 0.27)))
+            if student_count >= 2:
+                ranked = np.argsort(totals, kind='stable')
+                lower, upper = ranked[:group_size], ranked[-group_size:]
+                discrimination = (scores[upper].mean(axis=0) - scores[lower].mean(axis=0)) / max_marks
+            else:
+                discrimination = np.full(len(question_ids), np.nan)
+
+            # Item vs rest-of-paper correlation, so an item isn't correlated with itself
+            rest = totals[:, None] - scores
+            item_centered = scores - scores.mean(axis=0)
+            rest_centered = rest - rest.mean(axis=0)
+            point_biserial = (item_centered * rest_centered).sum(axis=0) / np.sqrt(
+                (item_centered ** 2).sum(axis=0) * (rest_centered ** 2).sum(axis=0)
+            )
+
+        option_counts = choices.sum(axis=0)
+
+        def as_float(value):
+            return None if np.isnan(value) else round(float(value), 3)
+
+        items = []
+        for column, question_id in enumerate(question_ids):
+            entry = answer_key[question_id]
+            items.append({
+                'number': column + 1,
+                'question_id': question_id,
+                'question_type': entry.question_type,
+                'max_marks': entry.max_marks,
+                'correct': sorted(entry.correct),
+                'difficulty': as_float(difficulty[column]),
+                'discrimination': as_float(discrimination[column]),
+                'point_biserial': as_float(point_biserial[column]),
+                'options': (
+                    [(letter, int(count), letter in entry.correct) for letter, count in zip('ABCD', option_counts[column])]
+                    if entry.is_auto_graded else []
+                ),
+            })
+
+        analysis = {
+            'student_count': student_count,
+            'group_size': group_size if student_count >= 2 else 0,
+            'mean_total': round(float(totals.mean()), 2) if student_count else None,
+            'max_total': float(max_marks.sum()),
+            'items': items,
+        }
+        cache.set(key, analysis, self.CACHE_TIMEOUT)
+        return analysis
+
+@receiver(post_save, sender=Quiz)
+def compile_live_quiz(sender, instance, **kwargs):
+    # Build the paper and answer key before students arrive rather than on the first request
+    if instance.status == 'live':
+        def compile_quiz():
+            quiz = Quiz.objects.filter(id=instance.id).first()
+            if quiz:
+                quiz.compiled_paper()
+                quiz.answer_key()
+        transaction.on_commit(compile_quiz)
+
+class AnswerKeyEntry(namedtuple('AnswerKeyEntry', ['question_type', 'correct', 'max_marks'])):
+    __slots__ = ()
+
+    @property
+    def is_auto_graded(self):
+        return self.question_type in ['objective', 'multichoice']
+
+    def is_correct(self, selected_answer):
+        if not selected_answer or not self.is_auto_graded:
+            return False
+        return frozenset(selected_answer.split(',')) == self.correct
+
 class Question(models.Model):
     QUESTION_TYPES = [
         ('objective', 'Objective'),
@@ -326,6 +1308,67 @@ class Question(models.Model):
     def __str__(self):
         return f"{self.quiz.title} - Q{self.id}"
 
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def bump_quiz_content_version(sender, instance, **kwargs):
+    Quiz.bump_content_version(instance.quiz_id)
+
+class QuizAttemptManager(models.Manager):
+    def close_expired(self, now=None):
+        """
+        Submit every open attempt whose time has run out, either because its
+        duration has elapsed or because the quiz itself has ended.
+
+        Scores come from the answers already saved (and graded) by auto-save,
+        summed with one UPDATE per quiz. Returns the number of attempts closed.
+        """
+        now = now or timezone.now()
+        closed = 0
+
+        quiz_ids = self.filter(is_submitted=False).values_list('quiz_id', flat=True).distinct()
+        for quiz in Quiz.objects.filter(id__in=list(quiz_ids)):
+            cutoff = now if quiz.end_time <= now else now - timedelta(minutes=quiz.duration_minutes)
+            answer_key = quiz.answer_key()
+            auto_graded_ids = [question_id for question_id, entry in answer_key.items() if entry.is_auto_graded]
+            total_marks = sum(entry.max_marks for entry in answer_key.values())
+            has_theory = any(entry.question_type == 'theory' for entry in answer_key.values())
+
+            auto_score = Coalesce(
+                Subquery(
+                    QuizAnswer.objects.filter(
+                        attempt=OuterRef('pk'), is_correct=True, question_id__in=auto_graded_ids
+                    ).values('attempt').annotate(total=Sum('question__max_marks')).values('total')
+                ),
+                0
+            )
+            fields = {'end_time': now, 'is_submitted': True, 'auto_score': auto_score}
+            if not has_theory:
+                # Same rule as a normal submission: fully auto-graded quizzes are final at once
+                fields['final_score'] = ExpressionWrapper(
+                    auto_score * Value(100.0) / Value(float(total_marks or 1)),
+                    output_field=DecimalField(max_digits=5, decimal_places=2)
+                )
+                fields['is_graded'] = True
+
+            with transaction.atomic():
+                # Lock the rows so a student's own submit can't race the auto-submit
+                expired = list(self.select_for_update().filter(
+                    quiz=quiz, is_submitted=False, start_time__lte=cutoff
+                ).values_list('id', flat=True))
+                if not expired:
+                    continue
+                self.filter(id__in=expired).update(**fields)
+                IntegrityEvent.objects.bulk_create([
+                    IntegrityEvent(attempt_id=attempt_id, event='auto_submit', details='Time expired', timestamp=now)
+                    for attempt_id in expired
+                ])
+                Quiz.bump_results_version(quiz.id)
+            closed += len(expired)
+        return closed
+
+def generate_shuffle_seed():
+    return secrets.randbits(31)
+
 class QuizAttempt(models.Model):
     quiz = models.ForeignKey(Quiz, on_delete=models.CASCADE)
     student = models.ForeignKey(Student, on_delete=models.CASCADE)
@@ -338,23 +1381,129 @@ class QuizAttempt(models.Model):
     is_graded = models.BooleanField(default=False)
     integrity_log = models.TextField(default='[]')
     tab_switches = models.IntegerField(default=0)
+    autosave_seq = models.IntegerField(default=0)
+    shuffle_seed = models.PositiveIntegerField(default=generate_shuffle_seed)
+
+    objects = QuizAttemptManager()
 
     class Meta:
         unique_together = ['quiz', 'student']
 
+    def deadline(self, quiz):
+        """When this attempt stops taking answers: its duration or the quiz end, whichever is first."""
+        return min(self.start_time + timedelta(minutes=quiz.duration_minutes), quiz.end_time)
+
+    def order_paper(self, quiz, paper):
+        """Apply this attempt's question and option order to compiled paper entries.
+
+        Each question's position and option order are derived from the seed and
+        the question id, so the paper comes out the same on every reload and in
+        review, and adding or removing a question doesn't reshuffle the rest.
+        """
+        if quiz.shuffle_questions:
+            paper = sorted(paper, key=lambda question: random.Random(f"{self.shuffle_seed}:{question['id']}").random())
+        
+        ordered = []
+        for question in paper:
+            options = question['options']
+            if quiz.shuffle_options and options:
+                options = list(options)
+                random.Random(f"{self.shuffle_seed}:{question['id']}:options").shuffle(options)
+            # Options are labelled by position; the submitted value stays the original letter
+            ordered.append(dict(question, options=[
+                (label, letter, html) for label, (letter, html) in zip('ABCD', options)
+            ]))
+        return ordered
+
     def add_integrity_event(self, event_type, details=''):
-        log = json.loads(self.integrity_log)
-        log.append({
-            'timestamp': timezone.now().isoformat(),
-            'event': event_type,
-            'details': details
-        })
-        self.integrity_log = json.dumps(log)
+        # One narrow INSERT per event; the attempt row itself is never rewritten
+        IntegrityEvent.objects.create(attempt_id=self.id, event=event_type, details=details)
         
         if event_type == 'tab_switch':
+            QuizAttempt.objects.filter(id=self.id).update(tab_switches=F('tab_switches') + 1)
             self.tab_switches += 1
-        
-        self.save()
+    
+    def get_integrity_log(self):
+        """Full integrity log as a list, including entries from the legacy JSON field."""
+        log = json.loads(self.integrity_log or '[]')
+        log.extend(
+            {'timestamp': timestamp.isoformat(), 'event': event, 'details': details}
+            for timestamp, event, details in self.integrity_events.values_list('timestamp', 'event', 'details')
+        )
+        return log
+
+class IntegrityEvent(models.Model):
+    attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name='integrity_events')
+    event = models.CharField(max_length=50)
+    details = models.TextField(blank=True)
+    timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['timestamp', 'id']
+
+    def __str__(self):
+        return f"{self.attempt} - {self.event}"
+
+class QuizAnswerManager(models.Manager):
+    def apply_theory_scores(self, quiz, scores):
+        """
+        Save teacher scores for a batch of theory answers in one go.
+
+        scores maps answer id to a (score, feedback) pair. Changed answers are
+        written with bulk_update, each affected attempt's manual score is moved
+        by its score delta and its final score recomputed from that, so nothing
+        is re-summed. Returns the number of answers changed.
+        """
+        answer_key = quiz.answer_key()
+        theory_ids = [question_id for question_id, entry in answer_key.items() if entry.question_type == 'theory']
+
+        score_field = DecimalField(max_digits=5, decimal_places=2)
+        total_marks = sum(entry.max_marks for entry in answer_key.values()) or 1
+
+        with transaction.atomic():
+            # Read the old scores under a row lock so two saves of the same script
+            # can't both apply a delta worked out from the same starting value
+            answers = self.select_for_update().filter(
+                id__in=list(scores), attempt__quiz=quiz, question_id__in=theory_ids
+            ).only('id', 'attempt_id', 'question_id', 'manual_score', 'teacher_feedback')
+
+            changed = []
+            deltas = defaultdict(Decimal)
+            for answer in answers:
+                score, feedback = scores[answer.id]
+                score = min(max(score, Decimal(0)), Decimal(answer_key[answer.question_id].max_marks))
+                if score == answer.manual_score and feedback == answer.teacher_feedback:
+                    continue
+                deltas[answer.attempt_id] += score - answer.manual_score
+                answer.manual_score = score
+                answer.teacher_feedback = feedback
+                changed.append(answer)
+
+            if not changed:
+                return 0
+
+            manual_delta = Case(
+                *[When(id=attempt_id, then=Value(delta)) for attempt_id, delta in deltas.items()],
+                default=Value(Decimal(0)),
+                output_field=score_field
+            )
+
+            self.bulk_update(changed, ['manual_score', 'teacher_feedback'])
+            attempts = QuizAttempt.objects.filter(id__in=list(deltas))
+            attempts.update(manual_score=F('manual_score') + manual_delta)
+            # A second UPDATE so final_score reads the new manual_score; backends
+            # disagree on whether one SET clause sees another's assignment
+            attempts.update(
+                final_score=ExpressionWrapper(
+                    (F('auto_score') + F('manual_score')) * Value(100.0) / Value(float(total_marks)),
+                    output_field=score_field
+                ),
+                is_graded=~Exists(self.filter(
+                    attempt=OuterRef('pk'), question_id__in=theory_ids, manual_score=0
+                ))
+            )
+            Quiz.bump_results_version(quiz.id)
+        return len(changed)
 
 class QuizAnswer(models.Model):
     attempt = models.ForeignKey(QuizAttempt, on_delete=models.CASCADE, related_name='answers')
@@ -365,13 +1514,19 @@ class QuizAnswer(models.Model):
     manual_score = models.DecimalField(max_digits=5, decimal_places=2, default=0)
     teacher_feedback = models.TextField(blank=True)
 
-    def save(self, *args, **kwargs):
-        if self.question.question_type in ['objective', 'multichoice'] and self.selected_answer:
-            if self.question.question_type == 'multichoice':
-                # For multichoice, check if selected answers match correct answers
-                selected = set(self.selected_answer.split(','))
-                correct = set(self.question.correct_answer.split(','))
-                self.is_correct = selected == correct
-            else:
-                self.is_correct = self.selected_answer == self.question.correct_answer
+    objects = QuizAnswerManager()
+
+    class Meta:
+        unique_together = ['attempt', 'question']
+
+    def grade(self, answer_key):
+        entry = answer_key.get(self.question_id)
+        if entry and entry.is_auto_graded and self.selected_answer:
+            self.is_correct = entry.is_correct(self.selected_answer)
+
+    def save(self, *args, answer_key=None, **kwargs):
+        if answer_key is None:
+            quiz = Quiz.objects.only('id', 'content_version').get(questions=self.question_id)
+            answer_key = quiz.answer_key()
+        self.grade(answer_key)
         super().save(*args, **kwargs)
\ No newline at end of file
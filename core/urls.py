@@ -24,9 +24,13 @@ urlpatterns = [
     path('teacher/question/<int:question_id>/edit/', views.edit_question, name='edit_question'),
     path('api/delete-question/<int:question_id>/', views.delete_question, name='delete_question'),
     path('teacher/question-bank/', views.question_bank, name='question_bank'),
+    path('teacher/question-bank/import/', views.import_question_bank, name='import_question_bank'),
     path('api/add-question-from-bank/', views.add_question_from_bank, name='add_question_from_bank'),
+    path('api/add-questions-from-bank/', views.add_questions_from_bank, name='add_questions_from_bank'),
     path('upload-image/', views.upload_image, name='upload_image'),
     path('teacher/quiz/<int:quiz_id>/results/', views.quiz_results, name='quiz_results'),
+    path('teacher/quiz/<int:quiz_id>/item-analysis/', views.quiz_item_analysis, name='quiz_item_analysis'),
+    path('teacher/quiz/<int:quiz_id>/sync-scores/', views.sync_quiz_scores, name='sync_quiz_scores'),
     path('teacher/quiz/<int:quiz_id>/grade-theory/', views.grade_theory, name='grade_theory'),
     path('api/delete-quiz/<int:quiz_id>/', views.delete_quiz, name='delete_quiz'),
     path('api/students-by-class/', views.get_students_by_class, name='get_students_by_class'),
@@ -34,6 +38,7 @@ urlpatterns = [
     path('api/get-components/', views.get_components, name='get_components'),
     path('api/get-student-results/', views.get_student_results, name='get_student_results'),
     path('api/update-component-score/', views.update_component_score, name='update_component_score'),
+    path('api/update-component-scores/', views.update_component_scores, name='update_component_scores'),
     
     # Class Teacher URLs
     path('class-teacher/broadsheet/', views.class_broadsheet, name='class_broadsheet'),
@@ -45,6 +50,8 @@ urlpatterns = [
     # Enhanced Quiz
     path('enhanced-quiz/<int:quiz_id>/', views.enhanced_quiz, name='enhanced_quiz'),
     path('view-quiz-result/<int:quiz_id>/', views.view_quiz_result, name='view_quiz_result'),
+    path('api/auto-save-quiz/', views.auto_save_quiz, name='auto_save_quiz'),
+    path('api/log-integrity-event/', views.log_integrity_event, name='log_integrity_event'),
     
     # Result Checking
     path('check-result/', views.check_result, name='check_result'),
@@ -2,9 +2,11 @@ from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth import login, authenticate
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
-from django.http import JsonResponse
+from django.http import JsonResponse, Http404
 from django.utils import timezone
 from django.db.models import Avg, Count
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 from .models import *
 
 def login_view(request):
@@ -168,29 +170,52 @@ def take_quiz(request, quiz_id):
         messages.info(request, 'You have already submitted this quiz')
         return redirect('dashboard')
     
-    questions = quiz.questions.all()
-    
     if request.method == 'POST':
-        for question in questions:
-            answer = request.POST.get(f'question_{question.id}')
+        from django.db import transaction
+        
+        answer_key = quiz.answer_key()
+        quiz_answers = []
+        auto_score = 0
+        for question_id, entry in answer_key.items():
+            answer = request.POST.get(f'question_{question_id}')
             if answer:
-                QuizAnswer.objects.update_or_create(
-                    attempt=attempt, question=question,
-                    defaults={'selected_answer': answer}
-                )
+                is_correct = entry.is_correct(answer)
+                if is_correct:
+                    auto_score += entry.max_marks
+                quiz_answers.append(QuizAnswer(
+                    attempt=attempt, question_id=question_id,
+                    selected_answer=answer, is_correct=is_correct
+                ))
         
-        attempt.end_time = timezone.now()
-        attempt.is_submitted = True
+        # Calculate score over marks, as enhanced_quiz does; theory answers wait for grading
+        has_theory = any(not entry.is_auto_graded for entry in answer_key.values())
+        total_marks = sum(entry.max_marks for entry in answer_key.values())
+        score = (auto_score / total_marks) * 100 if total_marks > 0 else 0
+        graded_fields = {} if has_theory else {'final_score': score, 'is_graded': True}
         
-        # Calculate score
-        correct_answers = attempt.answers.filter(is_correct=True).count()
-        total_questions = questions.count()
-        attempt.score = (correct_answers / total_questions) * 100 if total_questions > 0 else 0
-        attempt.save()
+        with transaction.atomic():
+            QuizAnswer.objects.bulk_create(
+                quiz_answers,
+                update_conflicts=True,
+                unique_fields=['attempt', 'question'],
+                update_fields=['selected_answer', 'is_correct']
+            )
+            QuizAttempt.objects.filter(id=attempt.id).update(
+                end_time=timezone.now(),
+                is_submitted=True,
+                auto_score=auto_score,
+                **graded_fields
+            )
+            Quiz.bump_results_version(quiz.id)
         
-        messages.success(request, f'Quiz submitted! Your score: {attempt.score:.1f}%')
+        if has_theory:
+            messages.success(request, f'Quiz submitted! Objective score: {score:.1f}%. Theory questions pending review.')
+        else:
+            messages.success(request, f'Quiz submitted! Your score: {score:.1f}%')
         return redirect('dashboard')
     
+    questions = quiz.questions.all()
+    
     return render(request, 'student/quiz.html', {
         'quiz': quiz,
         'questions': questions,
@@ -287,7 +312,11 @@ def edit_quiz(request, quiz_id):
         quiz.full_screen_mode = request.POST.get('full_screen_mode') == 'on'
         quiz.detect_tab_switching = request.POST.get('detect_tab_switching') == 'on'
         quiz.max_tab_switches = int(request.POST.get('max_tab_switches', 3))
-        quiz.save()
+        quiz.save(update_fields=[
+            'title', 'subject', 'school_class', 'start_time', 'end_time', 'duration_minutes',
+            'instructions', 'status', 'shuffle_questions', 'shuffle_options', 'full_screen_mode',
+            'detect_tab_switching', 'max_tab_switches'
+        ])
         
         messages.success(request, 'Quiz updated successfully')
         return redirect('quiz_management')
@@ -308,7 +337,46 @@ def quiz_results(request, quiz_id):
     
     return render(request, 'teacher/quiz_results.html', {
         'quiz': quiz,
-        'attempts': attempts
+        'attempts': attempts,
+        'linked_components': ResultComponent.objects.filter(linked_quiz=quiz).select_related('school_class', 'subject')
+    })
+
+@login_required
+def sync_quiz_scores(request, quiz_id):
+    """Copy graded quiz scores into the result components linked to the quiz."""
+    if request.user.role != 'subject_teacher' or request.method != 'POST':
+        return redirect('dashboard')
+    
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    teacher = Teacher.objects.get(user=request.user)
+    if quiz.teacher != teacher:
+        messages.error(request, 'You can only sync scores for your own quizzes')
+        return redirect('quiz_results', quiz_id=quiz_id)
+    
+    if not ResultComponent.objects.filter(linked_quiz=quiz).exists():
+        messages.info(request, 'No result component is linked to this quiz')
+        return redirect('quiz_results', quiz_id=quiz_id)
+    
+    written = ComponentResult.objects.sync_quiz(quiz)
+    messages.success(request, f'Quiz scores synced: {written} component score(s) updated')
+    return redirect('quiz_results', quiz_id=quiz_id)
+
+@login_required
+def quiz_item_analysis(request, quiz_id):
+    if request.user.role != 'subject_teacher':
+        return redirect('dashboard')
+    
+    quiz = get_object_or_404(Quiz, id=quiz_id)
+    analysis = quiz.item_analysis()
+    
+    # Question text is joined from the cached paper rather than stored in the analysis
+    paper = {question['id']: question for question in quiz.compiled_paper()}
+    for item in analysis['items']:
+        item['question'] = paper.get(item['question_id'])
+    
+    return render(request, 'teacher/item_analysis.html', {
+        'quiz': quiz,
+        'analysis': analysis
     })
 
 @login_required
@@ -317,64 +385,95 @@ def grade_theory(request, quiz_id):
         return redirect('dashboard')
     
     quiz = get_object_or_404(Quiz, id=quiz_id)
-    theory_questions = quiz.questions.filter(question_type='theory')
+    # Question text comes pre-rendered from the cached paper
+    theory_questions = [question for question in quiz.compiled_paper() if question['question_type'] == 'theory']
     
-    if not theory_questions.exists():
+    if not theory_questions:
         messages.info(request, 'This quiz has no theory questions')
         return redirect('quiz_management')
     
-    attempts = QuizAttempt.objects.filter(quiz=quiz, is_submitted=True).prefetch_related('answers__question')
-    
     if request.method == 'POST':
-        answer_id = request.POST.get('answer_id')
-        score = float(request.POST.get('score', 0))
-        feedback = request.POST.get('feedback', '')
-        
-        answer = QuizAnswer.objects.get(id=answer_id)
-        answer.manual_score = score
-        answer.teacher_feedback = feedback
-        answer.save()
-        
-        # Recalculate attempt scores
-        attempt = answer.attempt
-        
-        # Calculate auto score from objective and multichoice questions
-        auto_marks = 0
-        for ans in attempt.answers.filter(question__question_type__in=['objective', 'multichoice'], is_correct=True):
-            auto_marks += ans.question.max_marks
-        attempt.auto_score = auto_marks
-        
-        # Calculate manual score from theory questions
-        theory_score = attempt.answers.filter(question__question_type='theory').aggregate(total=models.Sum('manual_score'))['total'] or 0
-        attempt.manual_score = theory_score
+        # Every score on the page is submitted together; unchanged answers are skipped
+        from decimal import Decimal, InvalidOperation
         
-        # Calculate final score
-        total_marks = quiz.questions.aggregate(total=models.Sum('max_marks'))['total'] or 1
-        attempt.final_score = ((attempt.auto_score + attempt.manual_score) / total_marks) * 100
+        scores = {}
+        for key, value in request.POST.items():
+            answer_id = key[len('score_'):]
+            if not key.startswith('score_') or not answer_id.isdigit() or value == '':
+                continue
+            try:
+                score = Decimal(value)
+            except InvalidOperation:
+                continue
+            if score.is_finite():
+                scores[int(answer_id)] = (score, request.POST.get(f'feedback_{answer_id}', ''))
         
-        # Check if all theory questions are graded
-        ungraded = attempt.answers.filter(question__question_type='theory', manual_score=0).exists()
-        attempt.is_graded = not ungraded
-        attempt.save()
+        saved = QuizAnswer.objects.apply_theory_scores(quiz, scores)
         
-        messages.success(request, 'Score saved successfully')
-        return redirect('grade_theory', quiz_id=quiz_id)
+        messages.success(request, f'{saved} score(s) saved successfully')
+        # Stay on the same page and filters
+        return redirect(request.get_full_path())
+    
+    from django.core.paginator import Paginator
+    from django.db.models import Prefetch, Q
+    
+    # Filters: a single question column and/or only scripts still needing marks
+    question_id = request.GET.get('question', '')
+    shown_questions = theory_questions
+    if question_id.isdigit():
+        shown_questions = [question for question in theory_questions if question['id'] == int(question_id)] or theory_questions
+    shown_ids = [question['id'] for question in shown_questions]
+    ungraded_only = request.GET.get('status') == 'ungraded'
+    
+    attempts = QuizAttempt.objects.filter(quiz=quiz, is_submitted=True)
+    if ungraded_only:
+        # A theory answer counts as ungraded while its manual score is 0 (or it has no row yet)
+        attempts = attempts.annotate(
+            graded_answers=Count('answers', filter=Q(answers__question_id__in=shown_ids) & ~Q(answers__manual_score=0))
+        ).filter(graded_answers__lt=len(shown_ids))
+    attempts = attempts.select_related('student__user').order_by('student__student_id').prefetch_related(
+        Prefetch('answers', queryset=QuizAnswer.objects.filter(question_id__in=shown_ids), to_attr='theory_answers')
+    )
+    
+    page = Paginator(attempts, 20).get_page(request.GET.get('page'))
+    
+    # Create every missing placeholder answer on this page in one statement
+    missing = [
+        QuizAnswer(attempt=attempt, question_id=question['id'])
+        for attempt in page
+        for question in shown_questions
+        if question['id'] not in {answer.question_id for answer in attempt.theory_answers}
+    ]
+    if missing:
+        QuizAnswer.objects.bulk_create(missing, ignore_conflicts=True)
+        # Only the attempts that were missing answers need re-fetching; the rest keep their prefetch
+        refetch_ids = {answer.attempt_id for answer in missing}
+        created = QuizAnswer.objects.filter(attempt_id__in=refetch_ids, question_id__in=shown_ids)
+        answers_by_attempt = {}
+        for answer in created:
+            answers_by_attempt.setdefault(answer.attempt_id, []).append(answer)
+        for attempt in page:
+            if attempt.id in refetch_ids:
+                attempt.theory_answers = answers_by_attempt.get(attempt.id, [])
     
     # Prepare data for template
     attempts_data = []
-    for attempt in attempts:
-        theory_answers = []
-        for question in theory_questions:
-            try:
-                answer = QuizAnswer.objects.get(attempt=attempt, question=question)
-            except QuizAnswer.DoesNotExist:
-                answer = QuizAnswer.objects.create(attempt=attempt, question=question)
-            theory_answers.append({'question': question, 'answer': answer})
+    for attempt in page:
+        answers = {answer.question_id: answer for answer in attempt.theory_answers}
+        theory_answers = [
+            {'question': question, 'answer': answers[question['id']]}
+            for question in shown_questions
+            if question['id'] in answers
+        ]
         attempts_data.append({'attempt': attempt, 'theory_answers': theory_answers})
     
     return render(request, 'teacher/grade_theory.html', {
         'quiz': quiz,
-        'attempts_data': attempts_data
+        'attempts_data': attempts_data,
+        'page_obj': page,
+        'theory_questions': theory_questions,
+        'selected_question': question_id,
+        'ungraded_only': ungraded_only
     })
 
 @login_required
@@ -410,13 +509,78 @@ def question_bank(request):
     else:
         form = QuestionBankForm()
     
-    questions = QuestionBank.objects.filter(subject__in=teacher.subjects.all())
+    # Ranked search with subject/difficulty filters, one keyset page at a time
+    query = request.GET.get('q', '').strip()
+    subject_id = request.GET.get('subject', '')
+    difficulty = request.GET.get('difficulty', '')
+    
+    questions = QuestionBank.objects.search(query, after=request.GET.get('after')).filter(
+        subject__in=teacher.subjects.all()
+    ).select_related('subject')
+    if subject_id.isdigit():
+        questions = questions.filter(subject_id=subject_id)
+    if difficulty:
+        questions = questions.filter(difficulty=difficulty)
+    
+    page_size = QuestionBank.objects.PAGE_SIZE
+    questions = list(questions[:page_size + 1])
+    next_cursor = None
+    if len(questions) > page_size:
+        questions = questions[:page_size]
+        next_cursor = QuestionBank.objects.cursor_for(questions[-1])
+    
     return render(request, 'teacher/question_bank.html', {
         'questions': questions,
         'subjects': teacher.subjects.all(),
-        'form': form
+        'form': form,
+        'query': query,
+        'selected_subject': subject_id,
+        'selected_difficulty': difficulty,
+        'difficulties': QuestionBank._meta.get_field('difficulty').choices,
+        'next_cursor': next_cursor,
+        'quiz_id': request.GET.get('quiz_id', '')
     })
 
+@login_required
+def import_question_bank(request):
+    """Bulk import questions into the bank from a CSV, JSON lines or Aiken file."""
+    if request.user.role != 'subject_teacher':
+        return redirect('dashboard')
+    if request.method != 'POST' or not request.FILES.get('file'):
+        messages.error(request, 'Choose a file to import')
+        return redirect('question_bank')
+    
+    import io
+    import os
+    
+    teacher = Teacher.objects.get(user=request.user)
+    subjects = list(teacher.subjects.all())
+    upload = request.FILES['file']
+    
+    format = request.POST.get('format', '')
+    if not format:
+        extension = os.path.splitext(upload.name)[1].lower()
+        format = {'.csv': 'csv', '.jsonl': 'jsonl', '.json': 'jsonl', '.txt': 'aiken'}.get(extension, '')
+    if format not in ['csv', 'jsonl', 'aiken']:
+        messages.error(request, 'Unsupported file type. Use .csv, .jsonl or Aiken .txt')
+        return redirect('question_bank')
+    
+    subject_id = request.POST.get('subject', '')
+    default_subject = next((subject for subject in subjects if str(subject.id) == subject_id), None)
+    
+    # Decode the upload as a stream rather than reading it into memory
+    lines = io.TextIOWrapper(upload.file, encoding='utf-8-sig', errors='replace', newline='')
+    created, errors = QuestionBank.objects.import_questions(
+        lines, format, subjects, default_subject=default_subject, created_by=teacher
+    )
+    
+    messages.success(request, f'Imported {created} question(s)')
+    if errors:
+        messages.warning(request, f'{len(errors)} row(s) skipped')
+        for line_number, error in errors[:10]:
+            messages.warning(request, f'Line {line_number}: {error}')
+    return redirect('question_bank')
+
 @login_required
 def upload_image(request):
     if request.method == 'POST' and request.FILES.get('upload'):
@@ -449,23 +613,62 @@ def add_question_from_bank(request):
             quiz = Quiz.objects.get(id=quiz_id)
             bank_question = QuestionBank.objects.get(id=question_id)
             
-            Question.objects.create(
-                quiz=quiz,
-                question_type='objective',
-                question_text=bank_question.question_text,
-                option_a=bank_question.option_a,
-                option_b=bank_question.option_b,
-                option_c=bank_question.option_c,
-                option_d=bank_question.option_d,
-                correct_answer=bank_question.correct_answer,
-                max_marks=1
-            )
+            quiz.add_bank_questions([bank_question.id])
             
             return JsonResponse({'success': True})
         except Exception as e:
             return JsonResponse({'success': False, 'error': str(e)})
     return JsonResponse({'success': False})
 
+@login_required
+def add_questions_from_bank(request):
+    """
+    Add many bank questions to a quiz in one request, either an explicit list
+    ({quiz_id, question_ids}) or a random paper from a recipe
+    ({quiz_id, subject_id, recipe: {easy: 20, medium: 15, hard: 5}}).
+    """
+    if request.method != 'POST' or request.user.role != 'subject_teacher':
+        return JsonResponse({'success': False, 'error': 'Invalid request'}, status=400)
+    
+    import json
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'error': 'Invalid JSON'}, status=400)
+    
+    teacher = Teacher.objects.get(user=request.user)
+    try:
+        quiz = Quiz.objects.filter(id=data.get('quiz_id'), teacher=teacher).first()
+    except (TypeError, ValueError):
+        return JsonResponse({'success': False, 'error': 'Invalid quiz'}, status=400)
+    if not quiz:
+        return JsonResponse({'success': False, 'error': 'Quiz not found'}, status=404)
+    
+    # Only questions from the teacher's own subjects can be used
+    bank = QuestionBank.objects.filter(subject__in=teacher.subjects.all())
+    try:
+        max_marks = max(int(data.get('max_marks', 1)), 1)
+        if data.get('recipe'):
+            subject = teacher.subjects.filter(id=data.get('subject_id')).first()
+            if not subject:
+                return JsonResponse({'success': False, 'error': 'Subject not found'}, status=404)
+            recipe = {difficulty: int(count) for difficulty, count in data['recipe'].items()}
+            question_ids = QuestionBank.objects.sample(subject, recipe)
+        else:
+            question_ids = [int(question_id) for question_id in data.get('question_ids', [])]
+            allowed = set(bank.filter(id__in=question_ids).values_list('id', flat=True))
+            question_ids = [question_id for question_id in question_ids if question_id in allowed]
+    except (TypeError, ValueError, AttributeError) as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    if not question_ids:
+        return JsonResponse({'success': False, 'error': 'No questions selected'}, status=400)
+    
+    questions = quiz.add_bank_questions(question_ids, max_marks=max_marks)
+    return JsonResponse({'success': True, 'added': len(questions)})
+
 @login_required
 def edit_question(request, question_id):
     if request.user.role != 'subject_teacher':
@@ -538,37 +741,34 @@ def class_broadsheet(request):
     except ClassTeacher.DoesNotExist:
         return redirect('dashboard')
     
-    students = Student.objects.filter(school_class=class_teacher.school_class)
-    subjects = Subject.objects.all()
+    students = list(Student.objects.filter(school_class=class_teacher.school_class).select_related('user'))
+    subjects = list(Subject.objects.all())
     active_term = Term.objects.filter(is_active=True).first()
     
+    # Dense student x subject matrix, filled from a single result query
+    empty_cell = {'total': '-', 'grade': '-'}
+    matrix = {student.id: {subject.code: empty_cell for subject in subjects} for student in students}
+    totals = {student.id: [0, 0] for student in students}
+    
+    results = Result.objects.filter(
+        student__school_class=class_teacher.school_class,
+        term=active_term
+    ).values_list('student_id', 'subject__code', 'total_score', 'grade')
+    
+    for student_id, subject_code, total, grade in results:
+        matrix[student_id][subject_code] = {'total': total, 'grade': grade}
+        totals[student_id][0] += float(total)
+        totals[student_id][1] += 1
+    
     broadsheet_data = []
     for student in students:
-        student_results = {}
-        total_score = 0
-        subject_count = 0
-        
-        for subject in subjects:
-            try:
-                result = Result.objects.get(
-                    student=student, 
-                    subject=subject, 
-                    term=active_term
-                )
-                student_results[subject.code] = {
-                    'total': result.total_score,
-                    'grade': result.grade
-                }
-                total_score += float(result.total_score)
-                subject_count += 1
-            except Result.DoesNotExist:
-                student_results[subject.code] = {'total': '-', 'grade': '-'}
-        
+        total_score, subject_count = totals[student.id]
         average = total_score / subject_count if subject_count > 0 else 0
         
         broadsheet_data.append({
             'student': student,
-            'results': student_results,
+            'results': matrix[student.id],
+            'total': round(total_score, 2),
             'average': round(average, 2)
         })
     
@@ -659,6 +859,7 @@ def results_overview(request):
     return render(request, 'teacher/results_overview.html', {
         'classes': teacher.classes.all(),
         'subjects': teacher.subjects.all(),
+        'terms': Term.objects.all(),
     })
 
 @login_required
@@ -688,53 +889,81 @@ def get_components(request):
     
     return JsonResponse({'components': []})
 
+def student_results_etag(request):
+    """ETag for the component score grid, derived from the latest score/result changes."""
+    class_id = request.GET.get('class_id')
+    subject_id = request.GET.get('subject_id')
+    term_id = request.GET.get('term_id')
+    
+    if not (class_id and subject_id and term_id):
+        return None
+    
+    import hashlib
+    from django.db.models import Max
+    
+    component_ids = list(ResultComponent.objects.filter(
+        school_class_id=class_id,
+        subject_id=subject_id
+    ).order_by('id').values_list('id', 'weight', 'max_score'))
+    component_state = ComponentResult.objects.filter(
+        component__school_class_id=class_id,
+        component__subject_id=subject_id,
+        term_id=term_id
+    ).aggregate(latest=Max('updated_at'), count=Count('id'))
+    result_state = Result.objects.filter(
+        student__school_class_id=class_id,
+        subject_id=subject_id,
+        term_id=term_id
+    ).aggregate(latest=Max('updated_at'), count=Count('id'))
+    student_state = Student.objects.filter(school_class_id=class_id).aggregate(count=Count('id'), last=Max('id'))
+    
+    state = repr((component_ids, component_state, result_state, student_state))
+    return hashlib.md5(state.encode()).hexdigest()
+
 @login_required
+@cache_control(private=True, no_cache=True)
+@condition(etag_func=student_results_etag)
 def get_student_results(request):
     class_id = request.GET.get('class_id')
     subject_id = request.GET.get('subject_id')
     term_id = request.GET.get('term_id')
     
     if class_id and subject_id and term_id:
-        students = Student.objects.filter(school_class_id=class_id)
-        student_data = []
+        students = Student.objects.filter(school_class_id=class_id).select_related('user')
+        component_ids = list(ResultComponent.objects.filter(
+            school_class_id=class_id,
+            subject_id=subject_id
+        ).values_list('id', flat=True))
+        
+        # Component scores and final results for the whole class, one query each
+        scores = {}
+        for student_id, component_id, score in ComponentResult.objects.filter(
+            student__school_class_id=class_id,
+            component_id__in=component_ids,
+            term_id=term_id
+        ).values_list('student_id', 'component_id', 'score'):
+            scores[(student_id, component_id)] = float(score)
+        
+        results = {
+            student_id: (float(total_score), grade)
+            for student_id, total_score, grade in Result.objects.filter(
+                student__school_class_id=class_id,
+                subject_id=subject_id,
+                term_id=term_id
+            ).values_list('student_id', 'total_score', 'grade')
+        }
         
+        student_data = []
         for student in students:
-            # Get component scores
-            component_scores = {}
-            components = ResultComponent.objects.filter(
-                school_class_id=class_id,
-                subject_id=subject_id
-            )
-            
-            for component in components:
-                try:
-                    comp_result = ComponentResult.objects.get(
-                        student=student,
-                        component=component,
-                        term_id=term_id
-                    )
-                    component_scores[component.id] = float(comp_result.score)
-                except ComponentResult.DoesNotExist:
-                    component_scores[component.id] = None
-            
-            # Get final result
-            try:
-                result = Result.objects.get(
-                    student=student,
-                    subject_id=subject_id,
-                    term_id=term_id
-                )
-                total_score = float(result.total_score)
-                grade = result.grade
-            except Result.DoesNotExist:
-                total_score = None
-                grade = None
-            
+            total_score, grade = results.get(student.id, (None, None))
             student_data.append({
                 'id': student.id,
                 'name': student.user.get_full_name(),
                 'student_id': student.student_id,
-                'component_scores': component_scores,
+                'component_scores': {
+                    component_id: scores.get((student.id, component_id))
+                    for component_id in component_ids
+                },
                 'total_score': total_score,
                 'grade': grade
             })
@@ -795,6 +1024,104 @@ def update_component_score(request):
     
     return JsonResponse({'success': False, 'message': 'Invalid request method'})
 
+@login_required
+def update_component_scores(request):
+    """Save a batch of component score cells and recompute the affected results."""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'message': 'Invalid request method'})
+    
+    import json
+    from decimal import Decimal, InvalidOperation
+    from django.db import transaction
+    
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'success': False, 'message': 'Invalid JSON data'})
+    if not isinstance(data, dict):
+        return JsonResponse({'success': False, 'message': 'Invalid JSON data'})
+    
+    try:
+        cells = [
+            (int(cell['student_id']), int(cell['component_id']), cell.get('score'))
+            for cell in data.get('cells') or []
+        ]
+        term = Term.objects.get(id=data.get('term_id'))
+        teacher = Teacher.objects.get(user=request.user)
+    except (KeyError, TypeError, ValueError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Invalid cell data'})
+    except (Term.DoesNotExist, Teacher.DoesNotExist):
+        return JsonResponse({'success': False, 'message': 'Invalid term or teacher'})
+    
+    # Authorize once for the whole batch
+    subject_ids = set(teacher.subjects.values_list('id', flat=True))
+    class_ids = set(teacher.classes.values_list('id', flat=True))
+    components = ResultComponent.objects.in_bulk({component_id for _, component_id, _ in cells})
+    students = Student.objects.only('id', 'school_class_id').in_bulk({student_id for student_id, _, _ in cells})
+    
+    scores = {}
+    errors = []
+    for student_id, component_id, raw_score in cells:
+        component = components.get(component_id)
+        student = students.get(student_id)
+        error = {'student_id': student_id, 'component_id': component_id}
+        if component is None or student is None:
+            errors.append({**error, 'message': 'Unknown student or component'})
+            continue
+        if (component.subject_id not in subject_ids or
+                student.school_class_id not in class_ids or
+                component.school_class_id != student.school_class_id):
+            return JsonResponse({'success': False, 'message': 'Unauthorized'})
+        try:
+            score = Decimal(str(raw_score or 0)).quantize(Decimal('0.01'))
+            # NaN and Infinity quantize fine but can't be compared against max_score
+            if not score.is_finite():
+                raise InvalidOperation
+        except InvalidOperation:
+            errors.append({**error, 'message': 'Invalid score'})
+            continue
+        if score < 0 or score > component.max_score:
+            errors.append({**error, 'message': f'Score must be between 0 and {component.max_score}'})
+            continue
+        scores[(student_id, component_id)] = score
+    
+    affected = {}
+    for student_id, component_id in scores:
+        component = components[component_id]
+        affected.setdefault((component.school_class_id, component.subject_id), set()).add(student_id)
+    
+    with transaction.atomic():
+        ComponentResult.objects.bulk_create(
+            [
+                ComponentResult(student_id=student_id, component_id=component_id, term=term, score=score)
+                for (student_id, component_id), score in scores.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['student', 'component', 'term'],
+            update_fields=['score', 'updated_at'],
+            batch_size=500
+        )
+        for (class_id, subject_id), student_ids in affected.items():
+            Result.objects.recompute(term, school_class=class_id, subject=subject_id, students=student_ids)
+    
+    results = []
+    for (class_id, subject_id), student_ids in affected.items():
+        results.extend(
+            {'student_id': student_id, 'subject_id': subject_id, 'total_score': float(total_score), 'grade': grade}
+            for student_id, total_score, grade in Result.objects.filter(
+                student_id__in=student_ids,
+                subject_id=subject_id,
+                term=term
+            ).values_list('student_id', 'total_score', 'grade')
+        )
+    
+    return JsonResponse({
+        'success': not errors,
+        'saved': len(scores),
+        'results': results,
+        'errors': errors
+    })
+
 @login_required
 def student_promotion(request):
     teacher = Teacher.objects.get(user=request.user)
@@ -803,7 +1130,9 @@ def student_promotion(request):
     except ClassTeacher.DoesNotExist:
         return redirect('dashboard')
     
-    students = Student.objects.filter(school_class=class_teacher.school_class)
+    students = list(
+        Student.objects.filter(school_class=class_teacher.school_class).select_related('user', 'promoted_to')
+    )
     
     # Calculate promotion eligibility
     students_data = []
@@ -813,23 +1142,27 @@ def student_promotion(request):
     
     active_term = Term.objects.filter(is_active=True).first()
     
+    summaries = {}
+    if active_term:
+        summaries = {
+            summary.student_id: summary
+            for summary in StudentTermSummary.objects.filter(
+                student__school_class=class_teacher.school_class,
+                term=active_term
+            )
+        }
+        if len(summaries) < len(students):
+            summaries = {
+                summary.student_id: summary
+                for summary in StudentTermSummary.objects.refresh(class_teacher.school_class, active_term)
+            }
+    
     for student in students:
-        # Calculate average and failures
-        results = Result.objects.filter(student=student, term=active_term)
-        
-        if results.exists():
-            total_score = sum(float(r.total_score) for r in results)
-            average = total_score / results.count()
-            failures = results.filter(total_score__lt=50).count()
-        else:
-            average = 0
-            failures = 0
-        
-        # Mock attendance (in real system, get from attendance records)
-        attendance = 85  # Default attendance percentage
-        
-        # Check eligibility
-        eligible = (average >= 50 and failures <= 2 and attendance >= 75)
+        summary = summaries.get(student.id)
+        average = float(summary.average) if summary else 0
+        failures = summary.failures if summary else 0
+        attendance = summary.attendance_percentage if summary else None
+        eligible = summary.is_eligible_for_promotion if summary else False
         
         if student.is_promoted:
             promoted_count += 1
@@ -856,7 +1189,7 @@ def student_promotion(request):
         'eligible_count': eligible_count,
         'not_eligible_count': not_eligible_count,
         'promoted_count': promoted_count,
-        'total_students': students.count()
+        'total_students': len(students)
     })
 
 @login_required
@@ -932,45 +1265,119 @@ def view_analytics(request):
     
     return render(request, 'teacher/analytics.html', context)
 
+class Echo:
+    """File-like object whose write() hands the value back, for streaming csv.writer output."""
+    def write(self, value):
+        return value
+
 @login_required
 def export_results(request):
-    if request.user.role != 'subject_teacher':
+    if request.user.role not in ['subject_teacher', 'super_admin']:
         return redirect('dashboard')
     
     import csv
-    from django.http import HttpResponse
+    from django.db.models import F
+    from django.http import StreamingHttpResponse
     
     class_id = request.GET.get('class_id')
     subject_id = request.GET.get('subject_id')
+    term_id = request.GET.get('term_id')
+    include_components = request.GET.get('components') in ['1', 'on', 'true']
     
-    if not class_id or not subject_id:
-        messages.error(request, 'Please select class and subject')
-        return redirect('results_overview')
-    
-    school_class = SchoolClass.objects.get(id=class_id)
-    subject = Subject.objects.get(id=subject_id)
-    
-    response = HttpResponse(content_type='text/csv')
-    response['Content-Disposition'] = f'attachment; filename="{school_class.name}_{subject.code}_results.csv"'
+    results = Result.objects.all()
+    component_results = ComponentResult.objects.filter(
+        component__school_class=F('student__school_class')
+    )
+    components = ResultComponent.objects.all()
     
-    writer = csv.writer(response)
-    writer.writerow(['Student ID', 'Student Name', 'Total Score', 'Grade', 'Grade Point', 'Remark'])
+    # Subject teachers can only export their own classes and subjects
+    if request.user.role == 'subject_teacher':
+        teacher = Teacher.objects.get(user=request.user)
+        class_ids = list(teacher.classes.values_list('id', flat=True))
+        subject_ids = list(teacher.subjects.values_list('id', flat=True))
+        results = results.filter(student__school_class_id__in=class_ids, subject_id__in=subject_ids)
+        component_results = component_results.filter(
+            student__school_class_id__in=class_ids,
+            component__subject_id__in=subject_ids
+        )
+        components = components.filter(school_class_id__in=class_ids, subject_id__in=subject_ids)
     
-    results = Result.objects.filter(
-        student__school_class=school_class,
-        subject=subject
-    ).select_related('student__user')
-    
-    for result in results:
-        writer.writerow([
-            result.student.student_id,
-            result.student.user.get_full_name(),
-            result.total_score,
-            result.grade,
-            result.grade_point,
-            result.remark
-        ])
+    filename_parts = []
+    if class_id:
+        school_class = get_object_or_404(SchoolClass, id=class_id)
+        results = results.filter(student__school_class=school_class)
+        component_results = component_results.filter(student__school_class=school_class)
+        components = components.filter(school_class=school_class)
+        filename_parts.append(school_class.name)
+    if subject_id:
+        subject = get_object_or_404(Subject, id=subject_id)
+        results = results.filter(subject=subject)
+        component_results = component_results.filter(component__subject=subject)
+        components = components.filter(subject=subject)
+        filename_parts.append(subject.code)
+    if term_id:
+        term = get_object_or_404(Term, id=term_id)
+        results = results.filter(term=term)
+        component_results = component_results.filter(term=term)
+        filename_parts.append(term.name)
+    
+    component_names = []
+    if include_components:
+        component_names = sorted(set(components.values_list('component_name', flat=True)))
+    
+    # Both streams are ordered by the same key so component scores can be merged in
+    results = results.order_by('term_id', 'student_id', 'subject_id').values_list(
+        'term_id', 'student_id', 'subject_id',
+        'student__student_id', 'student__user__first_name', 'student__user__last_name',
+        'student__school_class__name', 'student__school_class__stream',
+        'subject__code', 'term__name',
+        'total_score', 'grade', 'grade_point', 'remark'
+    )
+    component_results = component_results.order_by('term_id', 'student_id', 'component__subject_id').values_list(
+        'term_id', 'student_id', 'component__subject_id', 'component__component_name', 'score'
+    )
     
+    def rows():
+        yield [
+            'Student ID', 'Student Name', 'Class', 'Subject', 'Term',
+            *component_names,
+            'Total Score', 'Grade', 'Grade Point', 'Remark'
+        ]
+        
+        scores_iter = component_results.iterator(chunk_size=2000) if include_components else iter(())
+        pending = next(scores_iter, None)
+        
+        for row in results.iterator(chunk_size=2000):
+            key = row[:3]
+            scores = {}
+            while pending is not None and pending[:3] < key:
+                pending = next(scores_iter, None)
+            while pending is not None and pending[:3] == key:
+                scores[pending[3]] = pending[4]
+                pending = next(scores_iter, None)
+            
+            (_, _, _, student_id, first_name, last_name, class_name, stream,
+             subject_code, term_name, total_score, grade, grade_point, remark) = row
+            yield [
+                student_id,
+                f"{first_name} {last_name}".strip(),
+                f"{class_name} {stream}".strip(),
+                subject_code,
+                term_name,
+                *[scores.get(name, '') for name in component_names],
+                total_score,
+                grade,
+                grade_point,
+                remark
+            ]
+    
+    writer = csv.writer(Echo())
+    filename = '_'.join(filename_parts or ['all']).replace(' ', '_')
+    response = StreamingHttpResponse(
+        (writer.writerow(row) for row in rows()),
+        content_type='text/csv'
+    )
+    response['Content-Disposition'] = f'attachment; filename="{filename}_results.csv"'
     return response
 
 @login_required
@@ -982,35 +1389,44 @@ def view_quiz_result(request, quiz_id):
     student = Student.objects.get(user=request.user)
     attempt = get_object_or_404(QuizAttempt, quiz=quiz, student=student, is_submitted=True)
     
-    questions = quiz.questions.all()
-    results = []
+    # Graded reviews only change on a regrade, which bumps the quiz's results_version
+    from django.core.cache import cache
+    cache_key = f'quiz_review:{attempt.id}:{quiz.content_version}:{quiz.results_version}'
+    results = cache.get(cache_key) if attempt.is_graded else None
     
-    for question in questions:
-        try:
-            answer = QuizAnswer.objects.get(attempt=attempt, question=question)
-            user_answer = answer.selected_answer if question.question_type in ['objective', 'multichoice'] else answer.theory_answer
-            user_answers_list = user_answer.split(',') if user_answer else []
-            correct_answers_list = question.correct_answer.split(',') if question.correct_answer else []
+    if results is None:
+        # Same order the student saw, derived from the attempt's shuffle seed
+        questions = attempt.order_paper(quiz, quiz.compiled_paper())
+        answer_key = quiz.answer_key()
+        
+        answers = {}
+        for answer in attempt.answers.only(
+            'attempt_id', 'question_id', 'selected_answer', 'theory_answer', 'is_correct', 'manual_score', 'teacher_feedback'
+        ):
+            answers[answer.question_id] = answer
+        
+        results = []
+        for question in questions:
+            answer = answers.get(question['id'])
+            if answer is None:
+                user_answer = None
+            elif question['question_type'] in ['objective', 'multichoice']:
+                user_answer = answer.selected_answer
+            else:
+                user_answer = answer.theory_answer
             
             results.append({
                 'question': question,
                 'user_answer': user_answer,
-                'user_answers_list': user_answers_list,
-                'correct_answers_list': correct_answers_list,
-                'is_correct': answer.is_correct,
-                'manual_score': answer.manual_score,
-                'feedback': answer.teacher_feedback
-            })
-        except QuizAnswer.DoesNotExist:
-            results.append({
-                'question': question,
-                'user_answer': None,
-                'user_answers_list': [],
-                'correct_answers_list': question.correct_answer.split(',') if question.correct_answer else [],
-                'is_correct': False,
-                'manual_score': 0,
-                'feedback': ''
+                'user_answers_list': user_answer.split(',') if user_answer else [],
+                'correct_answers_list': sorted(answer_key[question['id']].correct),
+                'is_correct': answer.is_correct if answer else False,
+                'manual_score': answer.manual_score if answer else 0,
+                'feedback': answer.teacher_feedback if answer else ''
             })
+        
+        if attempt.is_graded:
+            cache.set(cache_key, results, Quiz.CACHE_TIMEOUT)
     
     return render(request, 'student/view_quiz_result.html', {
         'quiz': quiz,
@@ -1028,16 +1444,9 @@ def generate_tokens(request):
         max_uses = int(request.POST.get('max_uses', 3))
         
         term = Term.objects.get(id=term_id)
-        students = Student.objects.all()
+        created = ResultToken.objects.generate_for_term(term, max_uses=max_uses)
         
-        for student in students:
-            ResultToken.objects.get_or_create(
-                student=student,
-                term=term,
-                defaults={'max_uses': max_uses}
-            )
-        
-        messages.success(request, f'Tokens generated for {students.count()} students')
+        messages.success(request, f'Tokens generated for {created} students')
         return redirect('generate_tokens')
     
     terms = Term.objects.all()
@@ -1048,25 +1457,24 @@ def check_result(request):
     if request.method == 'POST':
         token = request.POST.get('token', '').strip().upper()
         
-        try:
-            result_token = ResultToken.objects.get(token=token)
-            
-            if not result_token.can_use():
-                messages.error(request, 'Token usage limit exceeded')
-                return redirect('check_result')
-            
-            result_token.use_token()
+        if ResultToken.objects.redeem(token):
             return redirect('view_result_card', token=token)
-            
-        except ResultToken.DoesNotExist:
-            messages.error(request, 'Invalid token')
+        
+        if ResultToken.objects.filter(token=token).exists():
+            messages.error(request, 'Token usage limit exceeded')
+            return redirect('check_result')
+        
+        messages.error(request, 'Invalid token')
     
     return render(request, 'check_result.html')
 
 def view_result_card(request, token):
-    result_token = get_object_or_404(ResultToken, token=token)
-    student = result_token.student
-    term = result_token.term
+    ids = ResultToken.objects.lookup(token)
+    if ids is None:
+        raise Http404('Invalid token')
+    student_id, term_id = ids
+    student = get_object_or_404(Student.objects.select_related('user', 'school_class'), id=student_id)
+    term = get_object_or_404(Term, id=term_id)
     
     results = Result.objects.filter(student=student, term=term).select_related('subject')
     
@@ -1079,44 +1487,31 @@ def view_result_card(request, token):
     # Derive overall grade/remark from grading system
     overall_grade = None
     overall_remark = ''
-    grading = GradingSystem.objects.filter(
-        min_score__lte=average,
-        max_score__gte=average
-    ).first()
+    grading = GradingSystem.for_score(average)
     if grading:
         overall_grade = grading.grade
         overall_remark = grading.remark
     
-    # Batch/class ranking statistics
-    from django.db.models import Avg as AvgFunc
-    class_results = Result.objects.filter(
-        student__school_class=student.school_class,
-        term=term
-    ).values('student').annotate(avg=AvgFunc('total_score')).order_by('-avg')
-    
-    position = 1
-    class_highest = 0
-    class_lowest = 0
-    class_average = 0
-    
-    if class_results:
-        # Determine this student's position
-        for idx, cr in enumerate(class_results, 1):
-            if cr['student'] == student.id:
-                position = idx
-                break
-        
-        avg_values = [float(cr['avg']) for cr in class_results]
-        class_highest = max(avg_values)
-        class_lowest = min(avg_values)
-        class_average = sum(avg_values) / len(avg_values)
+    # Batch/class ranking statistics, precomputed per class and term
+    ranking = ClassRanking.objects.filter(student=student, term=term).first()
+    if ranking is None and total_subjects:
+        ClassRanking.objects.refresh(student.school_class, term)
+        ranking = ClassRanking.objects.filter(student=student, term=term).first()
+    
+    position = ranking.position if ranking else 1
+    class_highest = float(ranking.class_highest) if ranking else 0
+    class_lowest = float(ranking.class_lowest) if ranking else 0
+    class_average = float(ranking.class_average) if ranking else 0
     
     attendance = Attendance.objects.filter(student=student, term=term).first()
     comment = Comment.objects.filter(student=student, term=term).first()
     psychomotor = Psychomotor.objects.filter(student=student, term=term).first()
     effective_domain = EffectiveDomain.objects.filter(student=student, term=term).first()
     school_settings = SchoolSettings.objects.first()
-    total_students = Student.objects.filter(school_class=student.school_class).count()
+    if ranking:
+        total_students = ranking.class_size
+    else:
+        total_students = Student.objects.filter(school_class=student.school_class).count()
     
     context = {
         'student': student,
@@ -1162,6 +1557,99 @@ def revert_promotion(request):
     
     return JsonResponse({'success': False})
 
+@login_required
+def auto_save_quiz(request):
+    """Persist the answers a student changed since the last auto-save."""
+    if request.method != 'POST' or request.user.role != 'student':
+        return JsonResponse({'success': False, 'message': 'Invalid request'}, status=400)
+    
+    import json
+    from django.db import transaction
+    from django.db.models import F
+    
+    try:
+        data = json.loads(request.body)
+        quiz_id = int(data.get('quiz_id'))
+        answers = {int(question_id): str(value) for question_id, value in (data.get('answers') or {}).items()}
+    except (json.JSONDecodeError, TypeError, ValueError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Invalid JSON data'}, status=400)
+    
+    attempt = QuizAttempt.objects.filter(
+        quiz_id=quiz_id,
+        student__user=request.user
+    ).select_related('quiz').only(
+        'id', 'is_submitted', 'autosave_seq', 'start_time',
+        'quiz__id', 'quiz__content_version', 'quiz__duration_minutes', 'quiz__end_time'
+    ).first()
+    if attempt is None:
+        return JsonResponse({'success': False, 'message': 'Quiz attempt not found'}, status=404)
+    if attempt.is_submitted:
+        return JsonResponse({'success': False, 'message': 'Quiz already submitted'}, status=409)
+    # Late saves would otherwise be graded when close_expired submits the attempt
+    if timezone.now() > attempt.deadline(attempt.quiz):
+        return JsonResponse({'success': False, 'message': 'Quiz time is up'}, status=409)
+    
+    if not answers:
+        return JsonResponse({'success': True, 'seq': attempt.autosave_seq, 'saved': 0})
+    
+    answer_key = attempt.quiz.answer_key()
+    
+    quiz_answers = []
+    for question_id, value in answers.items():
+        entry = answer_key.get(question_id)
+        if entry is None:
+            continue
+        if entry.question_type == 'theory':
+            quiz_answers.append(QuizAnswer(attempt=attempt, question_id=question_id, theory_answer=value))
+            continue
+        if entry.question_type == 'multichoice':
+            value = ','.join(sorted(choice for choice in value.split(',') if choice))
+        quiz_answers.append(QuizAnswer(
+            attempt=attempt,
+            question_id=question_id,
+            selected_answer=value,
+            is_correct=entry.is_correct(value)
+        ))
+    
+    with transaction.atomic():
+        QuizAnswer.objects.bulk_create(
+            quiz_answers,
+            update_conflicts=True,
+            unique_fields=['attempt', 'question'],
+            update_fields=['selected_answer', 'theory_answer', 'is_correct']
+        )
+        QuizAttempt.objects.filter(id=attempt.id).update(autosave_seq=F('autosave_seq') + 1)
+    
+    return JsonResponse({'success': True, 'seq': attempt.autosave_seq + 1, 'saved': len(quiz_answers)})
+
+@login_required
+def log_integrity_event(request):
+    """Record an integrity event (tab switch, fullscreen exit, ...) for the student's attempt."""
+    if request.method != 'POST' or request.user.role != 'student':
+        return JsonResponse({'success': False, 'message': 'Invalid request'}, status=400)
+    
+    import json
+    
+    try:
+        data = json.loads(request.body)
+        quiz_id = int(data.get('quiz_id'))
+    except (json.JSONDecodeError, TypeError, ValueError, AttributeError):
+        return JsonResponse({'success': False, 'message': 'Invalid JSON data'}, status=400)
+    
+    event_type = str(data.get('event_type', ''))[:50]
+    if not event_type:
+        return JsonResponse({'success': False, 'message': 'Missing event type'}, status=400)
+    
+    attempt = QuizAttempt.objects.filter(
+        quiz_id=quiz_id,
+        student__user=request.user
+    ).only('id', 'tab_switches').first()
+    if attempt is None:
+        return JsonResponse({'success': False, 'message': 'Quiz attempt not found'}, status=404)
+    
+    attempt.add_integrity_event(event_type, str(data.get('details', ''))[:500])
+    return JsonResponse({'success': True, 'tab_switches': attempt.tab_switches})
+
 @login_required
 def enhanced_quiz(request, quiz_id):
     if request.user.role != 'student':
@@ -1182,48 +1670,38 @@ def enhanced_quiz(request, quiz_id):
     if attempt.is_submitted:
         return redirect('view_quiz_result', quiz_id=quiz_id)
     
-    questions = list(quiz.questions.all())
-    
-    # Shuffle questions if enabled
-    if quiz.shuffle_questions:
-        import random
-        random.shuffle(questions)
-    
     if request.method == 'POST':
-        # Process submission
+        # Grade everything in memory against the cached answer key, then write in bulk
+        from django.db import transaction
+        
+        answer_key = quiz.answer_key()
         auto_score = 0
         total_objective_marks = 0
+        quiz_answers = []
         
-        for question in questions:
-            if question.question_type == 'objective':
-                answer = request.POST.get(f'question_{question.id}')
-                if answer:
-                    quiz_answer, created = QuizAnswer.objects.update_or_create(
-                        attempt=attempt, question=question,
-                        defaults={'selected_answer': answer}
-                    )
-                    if quiz_answer.is_correct:
-                        auto_score += question.max_marks
-                total_objective_marks += question.max_marks
+        for question_id, entry in answer_key.items():
+            if entry.is_auto_graded:
+                if entry.question_type == 'objective':
+                    selected = request.POST.get(f'question_{question_id}', '')
+                else:
+                    selected = ','.join(sorted(request.POST.getlist(f'question_{question_id}')))
+                
+                is_correct = entry.is_correct(selected)
+                if selected or entry.question_type == 'multichoice':
+                    quiz_answers.append(QuizAnswer(
+                        attempt=attempt, question_id=question_id,
+                        selected_answer=selected, is_correct=is_correct
+                    ))
+                if is_correct:
+                    auto_score += entry.max_marks
+                total_objective_marks += entry.max_marks
             
-            elif question.question_type == 'multichoice':
-                answers = request.POST.getlist(f'question_{question.id}')
-                selected = ','.join(sorted(answers)) if answers else ''
-                quiz_answer, created = QuizAnswer.objects.update_or_create(
-                    attempt=attempt, question=question,
-                    defaults={'selected_answer': selected}
-                )
-                if quiz_answer.is_correct:
-                    auto_score += question.max_marks
-                total_objective_marks += question.max_marks
-            
-            elif question.question_type == 'theory':
-                theory_answer = request.POST.get(f'theory_{question.id}')
+            elif entry.question_type == 'theory':
+                theory_answer = request.POST.get(f'theory_{question_id}')
                 if theory_answer:
-                    QuizAnswer.objects.update_or_create(
-                        attempt=attempt, question=question,
-                        defaults={'theory_answer': theory_answer}
-                    )
+                    quiz_answers.append(QuizAnswer(
+                        attempt=attempt, question_id=question_id, theory_answer=theory_answer
+                    ))
         
         # Update attempt
         attempt.end_time = timezone.now()
@@ -1231,14 +1709,28 @@ def enhanced_quiz(request, quiz_id):
         attempt.auto_score = auto_score
         
         # Check if all questions are auto-graded (objective/multichoice)
-        theory_questions = [q for q in questions if q.question_type == 'theory']
-        total_marks = sum(q.max_marks for q in questions)
+        theory_questions = [entry for entry in answer_key.values() if entry.question_type == 'theory']
+        total_marks = sum(entry.max_marks for entry in answer_key.values())
         
         if not theory_questions:
             attempt.final_score = (auto_score / total_marks * 100) if total_marks > 0 else 0
             attempt.is_graded = True
         
-        attempt.save()
+        with transaction.atomic():
+            QuizAnswer.objects.bulk_create(
+                quiz_answers,
+                update_conflicts=True,
+                unique_fields=['attempt', 'question'],
+                update_fields=['selected_answer', 'theory_answer', 'is_correct']
+            )
+            QuizAttempt.objects.filter(id=attempt.id).update(
+                end_time=attempt.end_time,
+                is_submitted=True,
+                auto_score=attempt.auto_score,
+                final_score=attempt.final_score,
+                is_graded=attempt.is_graded
+            )
+            Quiz.bump_results_version(quiz.id)
         
         # Log auto-submit reason if present
         auto_submit_reason = request.POST.get('auto_submit_reason')
@@ -1252,8 +1744,20 @@ def enhanced_quiz(request, quiz_id):
         
         return redirect('dashboard')
     
+    # The paper itself is cached per quiz; only ordering and saved answers are per student
+    questions = attempt.order_paper(quiz, quiz.compiled_paper())
+    
+    saved_answers = {}
+    for question_id, selected_answer, theory_answer in attempt.answers.values_list('question_id', 'selected_answer', 'theory_answer'):
+        saved_answers[str(question_id)] = theory_answer or selected_answer
+    
+    for index, question in enumerate(questions):
+        saved = saved_answers.get(str(question['id']), '')
+        questions[index] = dict(question, saved=saved, selected=saved.split(',') if saved else [])
+    
     return render(request, 'student/enhanced_quiz.html', {
         'quiz': quiz,
         'questions': questions,
-        'attempt': attempt
+        'attempt': attempt,
+        'saved_answers': saved_answers
     })
\ No newline at end of file
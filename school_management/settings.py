@@ -133,6 +133,8 @@ JAZZMIN_SETTINGS = {
         'core.ResultComponent': 'fas fa-puzzle-piece',
         'core.ComponentResult': 'fas fa-check-square',
         'core.Result': 'fas fa-poll',
+        'core.ClassRanking': 'fas fa-trophy',
+        'core.StudentTermSummary': 'fas fa-user-check',
         'core.ResultToken': 'fas fa-key',
         'core.Attendance': 'fas fa-calendar-check',
         'core.Comment': 'fas fa-comment',
@@ -143,6 +145,7 @@ JAZZMIN_SETTINGS = {
         'core.Question': 'fas fa-question',
         'core.QuizAttempt': 'fas fa-clipboard-check',
         'core.QuizAnswer': 'fas fa-check-double',
+        'core.IntegrityEvent': 'fas fa-user-secret',
         # Website models
         'website.NewsPost': 'fas fa-newspaper',
         'website.GalleryImage': 'fas fa-images',